@@ -0,0 +1,179 @@
+"""Benchmark nhanh cho graph_logic (không cần GUI).
+
+    python bench_graph.py            # chạy tất cả
+    python bench_graph.py heap       # chỉ 1 nhóm
+
+In ra thời gian + số liệu phụ (kích thước heap, ...) để so bản cũ / bản mới.
+"""
+import heapq
+import os
+import random
+import sys
+import time
+
+import graph_logic
+from graph_logic import GraphLogic, IndexedHeap
+
+
+def timed(fn, *args, **kw):
+    t0 = time.perf_counter(); res = fn(*args, **kw)
+    return res, time.perf_counter() - t0
+
+
+def dense_graph(n, p, directed, seed=1):
+    r = random.Random(seed); g = GraphLogic(is_directed=directed)
+    for i in range(n): g.add_node(i, 0, 0)
+    g.add_edges((u, v, r.randint(1, 1000)) for u in range(n) for v in range(n)
+                if u != v and (directed or u < v) and r.random() < p)
+    return g
+
+
+class PeakHeap(IndexedHeap):
+    """IndexedHeap có đếm kích thước lớn nhất (chỉ dùng khi đo)"""
+    __slots__ = ('peak',)
+
+    def push(self, v, k):
+        changed = super().push(v, k)
+        self.peak = max(getattr(self, 'peak', 0), len(self.heap))
+        return changed
+
+
+def peak_of(run):
+    """Chạy run() với IndexedHeap được thay bằng PeakHeap, trả về kích thước heap lớn nhất"""
+    made = []
+    class Probe(PeakHeap):
+        __slots__ = ()
+        def __init__(self, *a, **kw): super().__init__(*a, **kw); made.append(self)
+    graph_logic.IndexedHeap = Probe
+    try: run()
+    finally: graph_logic.IndexedHeap = IndexedHeap
+    return max((getattr(h, 'peak', 0) for h in made), default=0)
+
+
+# --- Bản cũ (heapq đẩy lười) để so sánh ---
+def lazy_dijkstra(g, s):
+    off, tgt, wts = g.offsets, g.targets, g.weights
+    dist = [float('inf')] * len(g); dist[s] = 0
+    pq = [(0, s)]; peak = 1
+    while pq:
+        d, u = heapq.heappop(pq)
+        if d > dist[u]: continue
+        for i in range(off[u], off[u + 1]):
+            v = tgt[i]; nd = d + wts[i]
+            if nd < dist[v]:
+                dist[v] = nd; heapq.heappush(pq, (nd, v))
+                if len(pq) > peak: peak = len(pq)
+    return dist, peak
+
+
+def lazy_prim(g, s):
+    off, tgt, wts = g.offsets, g.targets, g.weights
+    visited = bytearray(len(g)); visited[s] = 1; total = 0
+    pq = [(wts[i], s, tgt[i]) for i in range(off[s], off[s + 1])]; heapq.heapify(pq); peak = len(pq)
+    while pq:
+        w, u, v = heapq.heappop(pq)
+        if visited[v]: continue
+        visited[v] = 1; total += w
+        for i in range(off[v], off[v + 1]):
+            if not visited[tgt[i]]:
+                heapq.heappush(pq, (wts[i], v, tgt[i]))
+                if len(pq) > peak: peak = len(pq)
+    return total, peak
+
+
+def bench_heap():
+    print('== Heap: heapq đẩy lười vs IndexedHeap (decrease-key) ==')
+    for n, p in ((300, 0.9), (800, 0.5), (1500, 0.3)):
+        for directed in (True, False):
+            g = dense_graph(n, p, directed); csr = g.get_csr()
+            edges = len(csr.targets)
+            (dist, lazy_peak), t_lazy = timed(lazy_dijkstra, csr, 0)
+            res, t_new = timed(g.dijkstra, '0', None, trace=False)
+            assert all(res['dist'][csr.ids[i]] == d for i, d in enumerate(dist) if d != float('inf'))
+            g._invalidate(); g.get_csr()
+            new_peak = peak_of(lambda: g.dijkstra('0', None, trace=False))
+            print(f'dijkstra n={n} E={edges} {"dir" if directed else "undir"}: '
+                  f'heap {lazy_peak} -> {new_peak}, {t_lazy:.3f}s -> {t_new:.3f}s')
+            if directed: continue
+            (total, lazy_peak), t_lazy = timed(lazy_prim, csr, 0)
+            res, t_new = timed(g.prim, '0', trace=False)
+            assert res['weight'] == total
+            new_peak = peak_of(lambda: g.prim('0', trace=False))
+            print(f'prim     n={n} E={edges} undir: heap {lazy_peak} -> {new_peak}, {t_lazy:.3f}s -> {t_new:.3f}s')
+
+
+def bench_load():
+    print('== Nạp hàng loạt (add_edges) + lần đầu đổi chế độ (dựng view còn lại) ==')
+    for n, m in ((20_000, 200_000), (100_000, 1_000_000)):
+        r = random.Random(5); g = GraphLogic(is_directed=False)
+        for i in range(n): g.add_node(i, 0, 0)
+        edges = [(r.randrange(n), r.randrange(n), r.randint(1, 9)) for _ in range(m)]
+        _, t_load = timed(g.add_edges, edges)
+        _, t_mode = timed(g.set_mode, True)
+        print(f'load V={n} E={m}: add_edges {t_load:.2f}s, set_mode lần đầu {t_mode:.2f}s')
+
+
+def torus(k):
+    """Lưới xuyến k x k: mọi đỉnh bậc 4 -> luôn có chu trình Euler, 2k^2 cạnh"""
+    g = GraphLogic(is_directed=False)
+    for i in range(k * k): g.add_node(i, 0, 0)
+    g.add_edges((r * k + c, r * k + (c + 1) % k) for r in range(k) for c in range(k))
+    g.add_edges((r * k + c, ((r + 1) % k) * k + c) for r in range(k) for c in range(k))
+    return g
+
+
+def random_eulerian(n, m, seed=1):
+    """Đồ thị Euler thưa ngẫu nhiên ~m cạnh: 1 chu trình Hamilton ngẫu nhiên (liên thông) + các chu trình
+    ngắn ngẫu nhiên (mọi bậc chẵn); chu trình nào lặp cạnh đã có thì bỏ"""
+    r = random.Random(seed); g = GraphLogic(is_directed=False)
+    for i in range(n): g.add_node(i, 0, 0)
+    seen = set(); edges = []
+    def cycle(vs):
+        es = [frozenset(e) for e in zip(vs, vs[1:] + vs[:1])]
+        if len(set(es)) < len(es) or seen.intersection(es): return
+        seen.update(es); edges.extend(zip(vs, vs[1:] + vs[:1]))
+    cycle(r.sample(range(n), n))
+    while len(edges) < m: cycle(r.sample(range(n), r.randint(3, 8)))
+    g.add_edges(edges)
+    return g
+
+
+def bench_fleury():
+    # Mỗi bước có thể phải tìm 2 phía để thử cầu: trên lưới xuyến 2 phía gặp nhau gần -> ~hằng số / cạnh;
+    # trên đồ thị thưa ngẫu nhiên 2 phía thường phải lan xa -> tệ nhất O(E * (V + E)), tức O(E^2)
+    print('== Fleury (cầu Tarjan + tìm 2 phía): lưới xuyến vs đồ thị Euler thưa ngẫu nhiên ==')
+    cases = [(f'torus k={k}', lambda k=k: torus(k)) for k in (23, 71, 224)]   # ~1e3, 1e4, 1e5 cạnh
+    cases += [(f'random V={m // 4}', lambda m=m: random_eulerian(m // 4, m)) for m in (1_000, 10_000, 100_000)]
+    for name, make in cases:
+        g = make(); edges = g.stats()['edges']
+        res, t = timed(g.fleury, None, trace=False)
+        path = res['path']
+        assert len(path) == edges + 1 and path[0] == path[-1]
+        assert len({frozenset(e) for e in zip(path, path[1:])}) == edges
+        print(f'fleury {name} E={edges}: {t:.3f}s ({t / edges * 1e6:.1f} us/cạnh)')
+
+
+def bench_apsp():
+    print('== All-pairs: Floyd–Warshall (numpy) vs lặp Dijkstra vs Johnson ==')
+    for n, p in ((200, 0.05), (400, 0.15)):
+        g = dense_graph(n, p, True)
+        for method in ('auto', 'dijkstra', 'floyd', 'johnson'):
+            g._bump(); res, t = timed(g.all_pairs, method)
+            if isinstance(res, dict): print(f'{method:8} n={n} p={p}: {res["error"]}'); continue
+            print(f'{method:8} n={n} p={p}: {res.method} {t:.3f}s')
+
+
+def bench_multi():
+    print('== Nhiều nguồn (đường kính): tuần tự vs process pool ==')
+    g = torus(45)   # 2025 đỉnh, trọng số 1 -> BFS từ mọi đỉnh
+    g.add_edges((u, v, 1 + (int(u) * 7 + int(v)) % 9) for u, v, _ in list(g.raw_edges))   # có trọng số -> Dijkstra
+    for workers in (1, os.cpu_count() or 1):
+        g._bump(); res, t = timed(g.diameter, workers)   # bỏ cache source_summaries của lần trước
+        print(f'diameter V={len(g.nodes)} workers={workers}: {res["diameter"]} {t:.3f}s')
+
+
+BENCHES = {'heap': bench_heap, 'load': bench_load, 'fleury': bench_fleury, 'apsp': bench_apsp, 'multi': bench_multi}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHES:
+        BENCHES[name]()
@@ -1,372 +1,1852 @@
 import heapq
-from collections import deque
+from collections import deque, namedtuple, OrderedDict, Counter
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 import math
+import json
+import multiprocessing
+import os
+
+try:
+    import numpy as np   # Tùy chọn: chỉ cần cho xuất ma trận dense (get_dense_matrix)
+except ImportError:
+    np = None
 
 # Constants
 COLOR_MAP_BIPARTITE = {0: "#f44336", 1: "#2196f3"} 
 
+def _as_ndarray(a):
+    """array.array -> numpy (không copy; typecode của array cũng là mã dtype numpy)"""
+    return np.frombuffer(a, dtype=a.typecode) if len(a) else np.zeros(0, dtype=a.typecode)
+
+def _compact_dtype(values):
+    """dtype numpy nhỏ nhất biểu diễn đúng mọi giá trị (và số 0 của ô trống)"""
+    if values.dtype.kind in 'iu':
+        lo, hi = (int(values.min()), int(values.max())) if values.size else (0, 0)
+        for t in (np.int8, np.int16, np.int32):
+            if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max: return t
+        return np.int64
+    return np.float32 if np.array_equal(values.astype(np.float32), values) else np.float64
+
+def _natural_key(nid):
+    """Khóa sắp xếp tự nhiên: '2' < '10' < 'a' (không bao giờ so int với str)"""
+    return (0, int(nid), nid) if nid.isdecimal() else (1, 0, nid)
+
+class CSRGraph:
+    """Ảnh chụp chỉ-đọc (CSR) của danh sách kề: id đỉnh -> số nguyên liên tục.
+    Cạnh ra của đỉnh i nằm ở targets/weights[offsets[i]:offsets[i+1]], xếp theo thứ tự tự nhiên."""
+    __slots__ = ('ids', 'index', 'offsets', 'targets', 'weights', 'is_directed', '_rev')
+
+    def __init__(self, nodes, adj, is_directed, adj_order=None):
+        self.ids = sorted(nodes, key=_natural_key)           # idx -> nid
+        self.index = {nid: i for i, nid in enumerate(self.ids)}  # nid -> idx
+        self.is_directed = is_directed; self._rev = None
+        index = self.index
+        offsets = array('l', [0]); targets = array('l'); weights = []
+        for nid in self.ids:
+            row = adj.get(nid, {})
+            # adj_order đã xếp tự nhiên = thứ tự chỉ số -> khỏi sort lại
+            order = adj_order[nid] if adj_order is not None else sorted(row, key=_natural_key)
+            for v in order:
+                if v in index: targets.append(index[v]); weights.append(row[v])
+            offsets.append(len(targets))
+        # Trọng số nguyên -> 'q' (giữ nguyên kiểu int khi đọc ra), có số thực -> 'd'
+        typecode = 'q' if all(type(w) is int for w in weights) else 'd'
+        self.offsets = offsets; self.targets = targets; self.weights = array(typecode, weights)
+
+    def __len__(self): return len(self.ids)
+
+    def edge_source(self, i):
+        """Đỉnh gốc của cạnh thứ i (tìm nhị phân trên offsets)"""
+        return bisect_right(self.offsets, i) - 1
+
+    def reverse(self):
+        """CSR của đồ thị đảo chiều (hàng i = cạnh VÀO i), build 1 lần rồi giữ lại. Vô Hướng: chính nó"""
+        if not self.is_directed: return self
+        if self._rev is None:
+            n = len(self.ids); off, tgt, wts = self.offsets, self.targets, self.weights
+            rev = CSRGraph.__new__(CSRGraph)
+            rev.ids, rev.index, rev.is_directed, rev._rev = self.ids, self.index, True, self
+            offsets = array('l', [0]) * (n + 1)
+            for v in tgt: offsets[v + 1] += 1
+            for i in range(n): offsets[i + 1] += offsets[i]
+            cursor = array('l', offsets[:n])
+            targets = array('l', [0]) * len(tgt); weights = array(wts.typecode, [0]) * len(tgt)
+            for u in range(n):   # duyệt u tăng dần -> mỗi hàng tự xếp theo thứ tự tự nhiên
+                for i in range(off[u], off[u + 1]):
+                    v = tgt[i]; k = cursor[v]; cursor[v] = k + 1
+                    targets[k] = u; weights[k] = wts[i]
+            rev.offsets, rev.targets, rev.weights = offsets, targets, weights
+            self._rev = rev
+        return self._rev
+
+class Step(namedtuple('Step', 'type tpl u v x nodes', defaults=(None, None, None, None))):
+    """1 bước của trace. desc = tpl.format(u, v, x) chỉ được format khi thật sự cần hiển thị"""
+    __slots__ = ()
+
+    @property
+    def desc(self): return self.tpl.format(u=self.u, v=self.v, x=self.x)
+
+    def as_dict(self):
+        """Đổi về step dict kiểu cũ: {'type': ..., 'desc': ..., <field theo type>}"""
+        d = {'type': self.type, 'desc': self.desc}
+        if self.type == 'highlight': d['nodes'] = list(self.nodes) if self.nodes else [self.u]
+        elif self.type == 'current': d['node'] = self.u
+        elif self.type in ('traverse', 'relax'): d['u'] = self.u; d['v'] = self.v
+        elif self.type == 'color': d['node'] = self.u; d['color'] = self.x
+        elif self.type == 'path': d['nodes'] = list(self.nodes or ())
+        return d
+
+class StepTrace:
+    """Trace dạng cột (columnar): opcode / template / chỉ số đỉnh nằm trong mảng kiểu cố định.
+    ~40 byte/step thay vì 1 dict + 1 chuỗi desc. Hỗ trợ truy cập ngẫu nhiên (tua) và xuất file."""
+    OPS = ('highlight', 'current', 'traverse', 'relax', 'color', 'path', 'info')
+    _OP_CODE = {op: i for i, op in enumerate(OPS)}
+    _X_NONE, _X_INT, _X_FLOAT = 0, 1, 2
+
+    def __init__(self):
+        self.ops = array('B'); self.tpls = array('H')
+        self.us = array('i'); self.vs = array('i')           # chỉ số đỉnh, -1 = không có
+        self.xs = array('d'); self.xkind = bytearray()       # giá trị số + kiểu gốc (None/int/float)
+        self.node_off = array('l', [0]); self.node_flat = array('i')  # danh sách 'nodes' (path...)
+        self.ids = []; self._index = {}                      # intern id đỉnh
+        self.templates = []; self._tpl_index = {}            # intern template desc
+
+    @classmethod
+    def record(cls, gen):
+        """Ghi hết 1 generator iter_X -> (StepTrace, dict kết quả)"""
+        trace = cls()
+        return trace, trace.extend(gen)
+
+    def _intern(self, nid):
+        if nid is None: return -1
+        i = self._index.get(nid)
+        if i is None:
+            i = self._index[nid] = len(self.ids); self.ids.append(nid)
+        return i
+
+    def append(self, step):
+        t = self._tpl_index.get(step.tpl)
+        if t is None:
+            t = self._tpl_index[step.tpl] = len(self.templates); self.templates.append(step.tpl)
+        self.ops.append(self._OP_CODE[step.type]); self.tpls.append(t)
+        self.us.append(self._intern(step.u)); self.vs.append(self._intern(step.v))
+        x = step.x
+        if x is None: self.xs.append(0); self.xkind.append(self._X_NONE)
+        else: self.xs.append(x); self.xkind.append(self._X_INT if type(x) is int else self._X_FLOAT)
+        if step.nodes:
+            for nid in step.nodes: self.node_flat.append(self._intern(nid))
+        self.node_off.append(len(self.node_flat))
+
+    def extend(self, steps):
+        """Nạp nhiều step; nếu là generator iter_X thì trả về dict kết quả của nó"""
+        it = iter(steps)
+        try:
+            while True: self.append(next(it))
+        except StopIteration as stop:
+            return stop.value
+
+    def __len__(self): return len(self.ops)
+
+    def __getitem__(self, i):
+        if i < 0: i += len(self.ops)
+        if not 0 <= i < len(self.ops): raise IndexError(i)
+        ids = self.ids; u, v, kind = self.us[i], self.vs[i], self.xkind[i]
+        x = None if kind == self._X_NONE else (int(self.xs[i]) if kind == self._X_INT else self.xs[i])
+        a, b = self.node_off[i], self.node_off[i + 1]
+        nodes = [ids[k] for k in self.node_flat[a:b]] if b > a else None
+        return Step(self.OPS[self.ops[i]], self.templates[self.tpls[i]],
+                    ids[u] if u >= 0 else None, ids[v] if v >= 0 else None, x, nodes)
+
+    def __iter__(self):
+        for i in range(len(self.ops)): yield self[i]
+
+    def desc(self, i): return self[i].desc
+
+    def nbytes(self):
+        """Dung lượng các mảng cột (không tính bảng id/template)"""
+        cols = (self.ops, self.tpls, self.us, self.vs, self.xs, self.node_off, self.node_flat)
+        return sum(c.itemsize * len(c) for c in cols) + len(self.xkind)
+
+    def export(self, path):
+        """Xuất ra file JSON Lines: mỗi dòng 1 step dict kiểu cũ (desc được format lúc ghi)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for step in self:
+                f.write(json.dumps(step.as_dict(), ensure_ascii=False) + '\n')
+
+class IndexedHeap:
+    """Heap d-phân có chỉ mục cho phần tử 0..n-1 với decrease-key thật: mỗi phần tử chiếm tối đa 1 ô
+    (kích thước <= V, không tích mục cũ O(E) như heapq đẩy lười). Hòa khóa -> chỉ số nhỏ ra trước"""
+    __slots__ = ('d', 'heap', 'pos', 'key')
+
+    def __init__(self, n, d=4):
+        self.d = d
+        self.heap = []                      # heap[i] = phần tử
+        self.pos = array('l', [-1]) * n     # phần tử -> vị trí trong heap (-1: không có)
+        self.key = [None] * n
+
+    def __len__(self): return len(self.heap)
+
+    def __contains__(self, v): return self.pos[v] >= 0
+
+    def push(self, v, k):
+        """Thêm v với khóa k, hoặc giảm khóa nếu v đã có (bỏ qua nếu k không nhỏ hơn). True nếu đổi"""
+        i = self.pos[v]
+        if i < 0:
+            i = len(self.heap); self.heap.append(v)
+        elif not k < self.key[v]: return False
+        self.key[v] = k
+        self._up(i, v, k)
+        return True
+
+    def pop(self):
+        """Lấy (khóa, phần tử) nhỏ nhất"""
+        heap = self.heap; v = heap[0]; last = heap.pop()
+        self.pos[v] = -1
+        if heap: self._down(0, last, self.key[last])
+        return self.key[v], v
+
+    def _up(self, i, v, k):
+        heap, pos, key, d = self.heap, self.pos, self.key, self.d
+        while i:
+            p = (i - 1) // d; u = heap[p]; ku = key[u]
+            if not (k < ku or (k == ku and v < u)): break
+            heap[i] = u; pos[u] = i; i = p
+        heap[i] = v; pos[v] = i
+
+    def _down(self, i, v, k):
+        heap, pos, key, d = self.heap, self.pos, self.key, self.d
+        n = len(heap)
+        while True:
+            c = i * d + 1
+            if c >= n: break
+            # con nhỏ nhất trong d con
+            b = heap[c]; kb = key[b]
+            for j in range(c + 1, min(c + d, n)):
+                x = heap[j]; kx = key[x]
+                if kx < kb or (kx == kb and x < b): b, kb, c = x, kx, j
+            if not (kb < k or (kb == k and b < v)): break
+            heap[i] = b; pos[b] = i; i = c
+        heap[i] = v; pos[v] = i
+
+class DisjointSet:
+    """Union-find trên mảng cho phần tử 0..n-1: nén đường đi (vòng lặp, không đệ quy) + hợp theo hạng"""
+    __slots__ = ('parent', 'rank', 'count')
+
+    def __init__(self, n):
+        self.parent = array('l', range(n))
+        self.rank = bytearray(n)   # hạng <= log2(n) < 256
+        self.count = n             # số tập hiện có
+
+    def find(self, x):
+        parent = self.parent; root = x
+        while parent[root] != root: root = parent[root]
+        while parent[x] != root: parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        """Hợp 2 tập chứa a, b. False nếu đã cùng tập"""
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb: return False
+        rank = self.rank
+        if rank[ra] < rank[rb]: ra, rb = rb, ra
+        self.parent[rb] = ra
+        if rank[ra] == rank[rb]: rank[ra] += 1
+        self.count -= 1
+        return True
+
+class FlowNetwork:
+    """Đồ thị thặng dư (residual) dạng mảng cho luồng cực đại: cung 2k là cạnh thật, 2k+1 là cung ngược
+    (cap 0) -> đối của cung a là a ^ 1. Cung của u: arcs[first[u]:first[u + 1]] (cạnh ra trước, cung ngược sau)"""
+    __slots__ = ('n', 'to', 'cap', 'first', 'arcs')
+
+    def __init__(self, g):
+        off, tgt, wts = g.offsets, g.targets, g.weights
+        n = self.n = len(g); m = len(tgt)
+        to = array('l', [0]) * (2 * m); cap = array(wts.typecode, [0]) * (2 * m)
+        first = array('l', [0]) * (n + 1)
+        for u in range(n): first[u + 1] = off[u + 1] - off[u]
+        for v in tgt: first[v + 1] += 1
+        for u in range(n): first[u + 1] += first[u]
+        arcs = array('l', [0]) * (2 * m)
+        cursor = array('l', first[:n])
+        for u in range(n):
+            for i in range(off[u], off[u + 1]):
+                to[2 * i] = tgt[i]; cap[2 * i] = wts[i]; to[2 * i + 1] = u
+                arcs[cursor[u]] = 2 * i; cursor[u] += 1
+        for u in range(n):   # cung ngược xếp sau các cạnh ra của đỉnh đó
+            for i in range(off[u], off[u + 1]):
+                v = tgt[i]; arcs[cursor[v]] = 2 * i + 1; cursor[v] += 1
+        self.to, self.cap, self.first, self.arcs = to, cap, first, arcs
+
+    def reachable(self, s):
+        """Các đỉnh tới được từ s qua cung còn cap > 0"""
+        to, cap, first, arcs = self.to, self.cap, self.first, self.arcs
+        seen = bytearray(self.n); seen[s] = 1; queue = deque([s])
+        while queue:
+            u = queue.popleft()
+            for k in range(first[u], first[u + 1]):
+                a = arcs[k]; v = to[a]
+                if not seen[v] and cap[a] > 0: seen[v] = 1; queue.append(v)
+        return seen
+
+    def reaching(self, t):
+        """Các đỉnh còn đi tới được t qua cung còn cap > 0 (BFS ngược từ t)"""
+        to, cap, first, arcs = self.to, self.cap, self.first, self.arcs
+        seen = bytearray(self.n); seen[t] = 1; queue = deque([t])
+        while queue:
+            w = queue.popleft()
+            for k in range(first[w], first[w + 1]):
+                b = arcs[k] ^ 1; x = to[b ^ 1]   # cung b: x -> w
+                if not seen[x] and cap[b] > 0: seen[x] = 1; queue.append(x)
+        return seen
+
+    def min_cut(self, ids, source_side):
+        """Kết quả lát cắt: phía nguồn/đích + các cạnh thật đi từ phía nguồn sang phía đích"""
+        to, cap, n = self.to, self.cap, self.n
+        cut = [(ids[to[a ^ 1]], ids[to[a]], cap[a] + cap[a ^ 1]) for a in range(0, len(to), 2)
+               if source_side[to[a ^ 1]] and not source_side[to[a]]]
+        return {'source_side': [ids[u] for u in range(n) if source_side[u]],
+                'sink_side': [ids[u] for u in range(n) if not source_side[u]], 'cut': cut}
+
+def _dijkstra_core(g, s, t, trace):
+    """Dijkstra trên CSR từ chỉ số s, dừng khi chốt t (t=-1: chạy hết cả cây).
+    Trả về (dist, parent, settled) dạng mảng theo chỉ số"""
+    ids, off, tgt, wts = g.ids, g.offsets, g.targets, g.weights
+    pq = IndexedHeap(len(g)); pq.push(s, 0)
+    dist = [float('inf')] * len(g)
+    parent = array('l', [-1]) * len(g)
+    dist[s] = 0; settled = []
+    while pq:
+        d, u = pq.pop()
+        settled.append(u)
+        
+        if trace: yield Step('current', 'Xét {u} (min={x})', ids[u], None, d)
+        if u == t: break
+        
+        for i in range(off[u], off[u + 1]):
+            v = tgt[i]; new_cost = d + wts[i]
+            if new_cost < dist[v]:
+                dist[v] = new_cost; parent[v] = u
+                pq.push(v, new_cost)   # decrease-key, không đẩy thêm mục mới
+                if trace: yield Step('relax', 'Relax {v}={x}', ids[u], ids[v], new_cost)
+    return dist, parent, settled
+
+class _FrozenDict(dict):
+    """dict chỉ-đọc: vẫn là dict thật (json.dumps, isinstance, ==), mọi thao tác ghi -> TypeError.
+    Cho phép trả cùng 1 dict trong cache cho mọi lần gọi mà không ai sửa được cache"""
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('dict kết quả chỉ đọc, dùng dict(...) để có bản sửa được')
+    __setitem__ = __delitem__ = __ior__ = pop = popitem = clear = update = setdefault = _readonly
+
+    def __reduce__(self): return dict, (dict(self),)   # copy / pickle -> dict thường
+
+class ShortestPathTree:
+    """Cây đường đi ngắn nhất đầy đủ từ 1 nguồn, giữ nguyên dạng mảng trên snapshot CSR.
+    Hỏi đường/chi phí tới bất kỳ đích nào chỉ tốn O(độ dài đường đi)"""
+    __slots__ = ('g', 'source', 'dist', 'parent', 'order', '_dicts')
+
+    def __init__(self, g, source, dist, parent, order):
+        self.g = g; self.source = source
+        self.dist = dist; self.parent = parent; self.order = order   # order: các đỉnh tới được, theo thứ tự chốt
+        self._dicts = None   # (dist, parent) dạng _FrozenDict, dựng ở lần result() đầu tiên
+
+    def cost(self, nid):
+        i = self.g.index.get(nid)
+        if i is None or self.dist[i] == float('inf'): return None
+        return self.dist[i]
+
+    def path(self, nid):
+        if self.cost(nid) is None: return []
+        ids, parent = self.g.ids, self.parent
+        path = []; curr = self.g.index[nid]
+        while curr != -1: path.append(ids[curr]); curr = parent[curr]
+        path.reverse()
+        return path
+
+    def result(self, end=None):
+        """Dict kết quả giống dijkstra(trace=False). dist/parent là dict chỉ-đọc (theo thứ tự chốt), dựng O(V)
+        1 lần / cây rồi dùng chung -> lần hỏi sau (cache hit) chỉ tốn O(độ dài đường đi)"""
+        if self._dicts is None:
+            ids, dist, parent = self.g.ids, self.dist, self.parent
+            self._dicts = (_FrozenDict({ids[u]: dist[u] for u in self.order}),
+                           _FrozenDict({ids[u]: (ids[parent[u]] if parent[u] >= 0 else None) for u in self.order}))
+        path = self.path(end) if end is not None else []
+        return {'dist': self._dicts[0], 'parent': self._dicts[1],
+                'path': path, 'cost': self.cost(end) if path else None, 'settled': len(self.order)}
+
+def _sssp_row(g, s, unit=False):
+    """1 hàng all-pairs từ nguồn s: khoảng cách (array 'd', inf = không tới được) + đỉnh trước (array 'l').
+    unit=True (mọi trọng số = 1) -> BFS thay cho Dijkstra"""
+    if not unit:
+        dist, parent, _ = GraphLogic._drain(_dijkstra_core(g, s, -1, False))[1]
+        return array('d', dist), parent
+    off, tgt = g.offsets, g.targets; inf = float('inf')
+    dist = array('d', [inf]) * len(g); parent = array('l', [-1]) * len(g)
+    dist[s] = 0; queue = deque([s])
+    while queue:
+        u = queue.popleft(); d = dist[u] + 1
+        for i in range(off[u], off[u + 1]):
+            v = tgt[i]
+            if dist[v] == inf: dist[v] = d; parent[v] = u; queue.append(v)
+    return dist, parent
+
+CANCELLED_MSG = 'LỖI: Đã hủy.'
+CANCEL_POLL_SEC = 0.1   # Nhịp xem cờ Hủy khi đang chờ pool process
+
+def _stop(cancel):
+    """cancel: threading.Event (hoặc None) do luồng gọi đặt khi người dùng bấm Hủy"""
+    return cancel is not None and cancel.is_set()
+
+def _floyd_warshall(g, cancel=None):
+    """Floyd–Warshall vector hóa bằng numpy: mỗi đỉnh trung gian k là 1 phép toán n x n.
+    Trả về (dist, pred) dạng ndarray, hoặc None nếu có chu trình âm. Bị hủy -> dừng giữa chừng (kết quả dở)"""
+    n = len(g); off = g.offsets
+    row = np.repeat(np.arange(n, dtype=np.intp), np.diff(_as_ndarray(off))) if n else np.zeros(0, dtype=np.intp)
+    col = _as_ndarray(g.targets).astype(np.intp); w = _as_ndarray(g.weights).astype(np.float64)
+    dist = np.full((n, n), np.inf); dist[row, col] = w
+    if (dist.diagonal() < 0).any(): return None   # khuyên âm
+    np.fill_diagonal(dist, 0)
+    pred = np.full((n, n), -1, dtype=np.intp); pred[row, col] = row; np.fill_diagonal(pred, -1)
+    mask = np.empty((n, n), dtype=bool)
+    for k in range(n):
+        if _stop(cancel): break
+        cand = dist[:, k, None] + dist[None, k, :]
+        np.less(cand, dist, out=mask)
+        np.copyto(dist, cand, where=mask)
+        np.copyto(pred, pred[None, k, :], where=mask)   # đường i -> j đi qua k: đỉnh trước j = đỉnh trước j trên k -> j
+    if (dist.diagonal() < 0).any(): return None
+    return dist, pred
+
+def _johnson_potentials(g):
+    """Thế vị h cho Johnson: Bellman–Ford (hàng đợi) từ 1 nguồn ảo nối 0 tới mọi đỉnh.
+    Sau đó w(u, v) + h[u] - h[v] >= 0 -> chạy được Dijkstra. Trả về list h, hoặc None nếu có chu trình âm"""
+    n = len(g); off, tgt, wts = g.offsets, g.targets, g.weights
+    h = [0] * n; count = array('l', [0]) * n; queued = bytearray(b'\x01') * n; queue = deque(range(n))
+    while queue:
+        u = queue.popleft(); queued[u] = 0; hu = h[u]
+        for i in range(off[u], off[u + 1]):
+            v = tgt[i]; nh = hu + wts[i]
+            if nh < h[v]:
+                h[v] = nh
+                if not queued[v]:
+                    count[v] += 1
+                    if count[v] > n: return None   # vào hàng đợi quá n lần -> chu trình âm
+                    queued[v] = 1; queue.append(v)
+    return h
+
+def _johnson_rows(g, cancel=None):
+    """All-pairs kiểu Johnson (chịu được cạnh âm, không cần numpy): đổi trọng số theo thế vị rồi
+    Dijkstra từ mọi nguồn. Trả về (dist, pred) dạng list hàng array, hoặc None nếu có chu trình âm"""
+    h = _johnson_potentials(g)
+    if h is None: return None
+    n = len(g); off, tgt, wts = g.offsets, g.targets, g.weights
+    rg = CSRGraph.__new__(CSRGraph)   # Cùng cấu trúc, chỉ khác trọng số
+    rg.ids, rg.index, rg.is_directed, rg._rev = g.ids, g.index, g.is_directed, None
+    rg.offsets, rg.targets = off, tgt
+    rg.weights = array(wts.typecode, (max(0, wts[i] + h[u] - h[tgt[i]])   # max: chặn sai số làm tròn của số thực
+                                      for u in range(n) for i in range(off[u], off[u + 1])))
+    inf = float('inf'); dist = []; pred = []
+    for s in range(n):
+        if _stop(cancel): break
+        row, parent = _sssp_row(rg, s)
+        hs = h[s]
+        dist.append(array('d', (d - hs + h[j] if d != inf else inf for j, d in enumerate(row))))
+        pred.append(parent)
+    return dist, pred
+
+class AllPairs:
+    """Khoảng cách + đỉnh trước cho mọi cặp đỉnh, theo thứ tự đỉnh của get_matrix (= CSR ids).
+    dist[i][j] = inf nếu j không tới được từ i; pred[i][j] = đỉnh ngay trước j trên đường i -> j (-1: không có).
+    dist/pred là ndarray (Floyd–Warshall) hoặc list các hàng array (Dijkstra/BFS/Johnson lặp)"""
+    __slots__ = ('g', 'method', 'dist', 'pred', '_reach')
+
+    def __init__(self, g, method, dist, pred):
+        self.g = g; self.method = method; self.dist = dist; self.pred = pred; self._reach = None
+
+    @property
+    def nodes(self): return self.g.ids
+
+    def _value(self, x):
+        if x == float('inf'): return None
+        return int(x) if self.g.weights.typecode == 'q' else float(x)
+
+    def distance(self, u, v):
+        """Khoảng cách u -> v, None nếu không tới được"""
+        index = self.g.index
+        return self._value(self.dist[index[u]][index[v]])
+
+    def reachable(self, u, v):
+        index = self.g.index
+        return self.dist[index[u]][index[v]] != float('inf')
+
+    def path(self, u, v):
+        i, j = self.g.index[u], self.g.index[v]
+        if self.dist[i][j] == float('inf'): return []
+        pred, ids = self.pred[i], self.g.ids
+        path = [ids[j]]
+        while j != i: j = int(pred[j]); path.append(ids[j])
+        path.reverse()
+        return path
+
+    def closure(self):
+        """Bao đóng bắc cầu: reach[i][j] = j tới được từ i (ndarray bool hoặc list bytearray)"""
+        if self._reach is None:
+            if np is not None and isinstance(self.dist, np.ndarray): self._reach = np.isfinite(self.dist)
+            else:
+                inf = float('inf')
+                self._reach = [bytearray(x != inf for x in row) for row in self.dist]
+        return self._reach
+
+    def reachable_count(self):
+        """Số cặp (u, v) có v tới được từ u (kể cả u = v): ndarray -> .sum() vector hóa, bytearray -> sum theo hàng"""
+        reach = self.closure()
+        if np is not None and isinstance(reach, np.ndarray): return int(reach.sum())
+        return sum(map(sum, reach))
+
+    def block(self, r0, r1, c0, c1):
+        """Khối con khoảng cách [r0:r1) x [c0:c1) (None = không tới được), để hiển thị theo trang"""
+        return [[self._value(x) for x in self.dist[i][c0:c1]] for i in range(r0, min(r1, len(self.g)))]
+
+    def tree(self, u):
+        """ShortestPathTree của nguồn u đọc thẳng từ hàng u (không chạy lại Dijkstra)"""
+        i = self.g.index[u]; inf = float('inf')
+        dist = [inf if x == inf else self._value(x) for x in self.dist[i]]
+        order = sorted((j for j, x in enumerate(dist) if x != inf), key=dist.__getitem__)
+        return ShortestPathTree(self.g, u, dist, array('l', (int(p) for p in self.pred[i])), order)
+
+# --- Chạy nhiều nguồn song song (process pool): snapshot CSR gửi sang mỗi worker 1 lần ---
+_WORKER_G = None
+
+def _init_worker(g):
+    global _WORKER_G
+    _WORKER_G = g
+
+def _summary_chunk(g, sources, unit, cancel=None):
+    """Tóm tắt SSSP từ từng nguồn: [(khoảng cách xa nhất, số đỉnh tới được kể cả s, tổng khoảng cách)],
+    đồng thời cộng dồn theo cột -> (tổng khoảng cách, số nguồn) ĐẾN mỗi đỉnh (cho closeness)"""
+    inf = float('inf'); n = len(g)
+    rows = []; in_total = array('d', [0]) * n; in_count = array('l', [0]) * n
+    for s in sources:
+        if _stop(cancel): break
+        hi = 0; r = 0; total = 0
+        for j, d in enumerate(_sssp_row(g, s, unit)[0]):
+            if d != inf:
+                r += 1; total += d; in_total[j] += d; in_count[j] += 1
+                if d > hi: hi = d
+        rows.append((hi, r, total))
+    return rows, in_total, in_count
+
+def _pool_summary_chunk(job):
+    return _summary_chunk(_WORKER_G, *job)
+
+class AdjacencyView:
+    """Danh sách kề của đồ thị theo 1 chế độ (Có Hướng / Vô Hướng) + thống kê sống + cache CSR.
+    GraphLogic giữ song song view của cả 2 chế độ -> đổi chế độ chỉ là đổi view đang dùng."""
+    __slots__ = ('is_directed', 'adj', 'radj', 'order', 'csr',
+                 'weights', 'edge_count', 'neg_count', 'min_w', 'odd', 'unbalanced')
+
+    def __init__(self, is_directed, nodes=()):
+        self.is_directed = is_directed
+        self.adj = {n: {} for n in nodes}    # {u: {v: w}}
+        self.radj = {n: {} for n in nodes}   # Kề ngược (cạnh vào): {v: {u: w}} <=> adj[u][v] = w
+        self.order = {n: [] for n in nodes}  # Đỉnh kề của u xếp sẵn theo thứ tự tự nhiên: {u: ['2', '10', 'a']}
+        self.csr = None                      # Cache CSRGraph, build lười khi chạy thuật toán
+        # --- THỐNG KÊ SỐNG (cập nhật O(1) mỗi lần thêm/xóa cung) ---
+        self.weights = Counter()   # trọng số -> số cạnh (Vô Hướng: mỗi cạnh đếm 1 lần)
+        self.edge_count = 0; self.neg_count = 0
+        self.min_w = None          # Cache min trọng số, None = cần tính lại từ weights
+        self.odd = set()           # Đỉnh bậc lẻ (Vô Hướng: khuyên tính 2)
+        self.unbalanced = set()    # Đỉnh có bán bậc ra != vào (chỉ khác rỗng ở Có Hướng)
+
+    def add_node(self, nid):
+        if nid not in self.adj: self.adj[nid] = {}
+        if nid not in self.radj: self.radj[nid] = {}
+        if nid not in self.order: self.order[nid] = []
+
+    def add(self, u, v, w):
+        """Thêm/ghi đè cạnh u->v (Vô Hướng: cả chiều ngược lại)"""
+        self.link(u, v, w)
+        if not self.is_directed: self.link(v, u, w)
+
+    def add_many(self, edges):
+        """Nạp hàng loạt list cạnh (u, v, w) giữa các đỉnh đã add_node, cùng kết quả với add() từng cạnh:
+        cung mới chỉ nối vào cuối hàng, xong mới sort mỗi hàng bị chạm đúng 1 lần và tính lại bậc của chúng"""
+        adj, radj, order, directed = self.adj, self.radj, self.order, self.is_directed
+        fresh = []   # Trọng số các cạnh mới -> đếm 1 lượt ở cuối
+        for u, v, w in edges:
+            row = adj[u]
+            if v in row: self.add(u, v, w); continue   # Ghi đè trọng số: hiếm, đi đường thường
+            row[v] = w; radj[v][u] = w; order[u].append(v)
+            # Vô Hướng: 2 cung u->v, v->u luôn có/mất cùng nhau -> cung ngược cũng mới
+            if not directed and u != v: adj[v][u] = w; radj[u][v] = w; order[v].append(u)
+            fresh.append(w)
+        if fresh:
+            self.weights.update(fresh); self.edge_count += len(fresh); self.min_w = None
+            self.neg_count += sum(1 for w in fresh if w < 0)
+            # Ghi đè 1 cạnh mới của chính lô này bị trừ trước khi được cộng -> dọn các mục về 0
+            for w in [w for w, c in self.weights.items() if not c]: del self.weights[w]
+        if len(edges) >= len(order):
+            # Lô lớn: sort mọi hàng (hàng chưa đổi vốn đã sort -> timsort O(bậc)) theo hạng tự nhiên
+            # của đỉnh (so int nhanh hơn so tuple _natural_key)
+            touched = order
+            key = {x: i for i, x in enumerate(sorted(order, key=_natural_key))}.__getitem__
+        else: touched = {x for e in edges for x in e[:2]}; key = _natural_key
+        for x in touched:
+            order[x].sort(key=key)
+            self._recount_node(x)
+
+    def link(self, u, v, w):
+        """Thêm/ghi đè cung u->v trong adj, radj, order (chèn đúng chỗ, không sort lại)"""
+        row = self.adj.setdefault(u, {})
+        if v in row:
+            if row[v] == w: return
+            if self.is_directed or u <= v: self._count_weight(row[v], -1); self._count_weight(w, 1)
+            row[v] = w; self.radj[v][u] = w
+            return
+        insort(self.order.setdefault(u, []), v, key=_natural_key)
+        row[v] = w; self.radj.setdefault(v, {})[u] = w
+        self._count_arc(u, v, w, 1)
+
+    def unlink(self, u, v):
+        """Gỡ cung u->v khỏi adj, radj, order"""
+        row = self.adj.get(u)
+        if row is None or v not in row: return
+        w = row.pop(v); self.radj[v].pop(u, None)
+        self._drop_order(u, v)
+        self._count_arc(u, v, w, -1)
+
+    def _drop_order(self, u, v):
+        order = self.order[u]
+        del order[bisect_left(order, _natural_key(v), key=_natural_key)]
+
+    def remove_node(self, nid):
+        # Chỉ duyệt cạnh ra (adj) + cạnh vào (radj) của nid: O(bậc)
+        for v, w in self.adj.pop(nid, {}).items():
+            self.radj.get(v, {}).pop(nid, None)
+            self._count_arc(nid, v, w, -1)
+        for u, w in self.radj.pop(nid, {}).items():
+            if u != nid: del self.adj[u][nid]; self._drop_order(u, nid); self._count_arc(u, nid, w, -1)
+        self.order.pop(nid, None)
+        self.odd.discard(nid); self.unbalanced.discard(nid)
+
+    def _count_weight(self, w, sign):
+        c = self.weights[w] + sign
+        if c: self.weights[w] = c
+        else: del self.weights[w]
+        self.edge_count += sign
+        if w < 0: self.neg_count += sign
+        if sign > 0:
+            if self.min_w is not None and w < self.min_w: self.min_w = w
+        elif not c and w == self.min_w: self.min_w = None
+
+    def _count_arc(self, u, v, w, sign):
+        """Cung u->v vừa được thêm (+1) / gỡ (-1): cập nhật trọng số + bậc 2 đầu mút"""
+        odd = self.odd
+        if self.is_directed:
+            self._count_weight(w, sign)
+            if u != v:   # 1 cung: bậc u và v cùng đổi 1 -> đảo chẵn lẻ cả 2 (khuyên: +2, giữ nguyên)
+                for x in (u, v):
+                    if x in odd: odd.remove(x)
+                    else: odd.add(x)
+            for x in (u, v):   # cân bằng bán bậc vào/ra
+                if len(self.adj.get(x, ())) != len(self.radj.get(x, ())): self.unbalanced.add(x)
+                else: self.unbalanced.discard(x)
+        else:
+            # Vô Hướng: cạnh u-v có 2 cung, chỉ đếm trọng số ở cung u <= v; mỗi cung đổi bậc của u
+            if u <= v: self._count_weight(w, sign)
+            if u != v:
+                if u in odd: odd.remove(u)
+                else: odd.add(u)
+
+    def _recount_node(self, x):
+        """Tính lại từ đầu x có bậc lẻ / lệch bán bậc không (cùng quy ước với _count_arc)"""
+        row, rrow = self.adj.get(x, {}), self.radj.get(x, {})
+        deg = len(row) + len(rrow) if self.is_directed else len(row) - (x in row)
+        if deg % 2: self.odd.add(x)
+        else: self.odd.discard(x)
+        if self.is_directed and len(row) != len(rrow): self.unbalanced.add(x)
+        else: self.unbalanced.discard(x)
+
+    def degree(self, nid):
+        """Bậc của đỉnh: Có Hướng = vào + ra, Vô Hướng = số đầu mút cạnh (khuyên tính 2)"""
+        row = self.adj[nid]
+        return len(row) + len(self.radj[nid]) if self.is_directed else len(row) + (nid in row)
+
+    def min_weight(self):
+        if self.min_w is None and self.weights: self.min_w = min(self.weights)
+        return self.min_w
+
+class SpatialGrid:
+    """Chỉ mục không gian lưới đều trên tọa độ đỉnh: ô (cx, cy) -> tập id đỉnh trong ô.
+    Hỏi điểm / hình chữ nhật chỉ xét các ô phủ vùng hỏi -> click O(1) kể cả khi có 100k đỉnh"""
+    __slots__ = ('pos', 'cell', 'cells', 'where')
+
+    def __init__(self, pos, cell=64):
+        self.pos = pos; self.cell = cell   # pos: dict nid -> (x, y) dùng chung với GraphLogic.nodes
+        self.cells = {}; self.where = {}   # where: nid -> ô đang chứa
+
+    def cell_of(self, x, y): return int(x // self.cell), int(y // self.cell)
+
+    def insert(self, nid, x, y):
+        """Thêm / dời đỉnh (chỉ đụng tới bucket khi đổi ô)"""
+        key = self.cell_of(x, y); old = self.where.get(nid)
+        if old == key: return
+        if old is not None: self._discard(nid, old)
+        self.cells.setdefault(key, set()).add(nid); self.where[nid] = key
+
+    def remove(self, nid):
+        old = self.where.pop(nid, None)
+        if old is not None: self._discard(nid, old)
+
+    def _discard(self, nid, key):
+        bucket = self.cells[key]; bucket.discard(nid)
+        if not bucket: del self.cells[key]
+
+    def cell_items(self, x0, y0, x1, y1):
+        """[(ô, tập đỉnh)] của các ô có đỉnh giao với [x0, x1] x [y0, y1]"""
+        (c0, r0), (c1, r1) = self.cell_of(x0, y0), self.cell_of(x1, y1)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > len(self.cells):   # vùng rộng hơn số ô có đỉnh -> duyệt ô có đỉnh
+            return [(k, b) for k, b in self.cells.items() if c0 <= k[0] <= c1 and r0 <= k[1] <= r1]
+        cells = self.cells
+        return [((c, r), cells[c, r]) for c in range(c0, c1 + 1) for r in range(r0, r1 + 1) if (c, r) in cells]
+
+    def _buckets(self, x0, y0, x1, y1): return [b for _, b in self.cell_items(x0, y0, x1, y1)]
+
+    def count_rect(self, x0, y0, x1, y1):
+        """Cận trên số đỉnh trong hình chữ nhật (cộng cỡ các ô phủ nó, không lọc tọa độ)"""
+        return sum(len(b) for b in self._buckets(x0, y0, x1, y1))
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Các đỉnh có tọa độ trong [x0, x1] x [y0, y1] (dùng cho cắt theo viewport)"""
+        pos = self.pos
+        return [nid for b in self._buckets(x0, y0, x1, y1) for nid in b
+                if x0 <= pos[nid][0] <= x1 and y0 <= pos[nid][1] <= y1]
+
+    def nearest(self, x, y, r):
+        """Đỉnh gần (x, y) nhất trong bán kính r, None nếu không có"""
+        best = None; best_d = r * r
+        for b in self._buckets(x - r, y - r, x + r, y + r):
+            for nid in b:
+                px, py = self.pos[nid]; d = (px - x) ** 2 + (py - y) ** 2
+                if d <= best_d and (best is None or d < best_d or _natural_key(nid) < _natural_key(best)): best, best_d = nid, d
+        return best
+
 class GraphLogic:
+    # Cache cây đường đi ngắn nhất (theo nguồn), bỏ cây dùng lâu nhất (LRU) khi vượt 1 trong 2 giới hạn.
+    # Mỗi cây tốn O(V) -> giới hạn theo tổng V x số cây; gán lại trên instance để chỉnh theo bộ nhớ máy
+    SPT_CACHE_SIZE = 64          # Số cây tối đa
+    SPT_CACHE_NODES = 500_000    # Tối đa V x số cây (luôn giữ được ít nhất 1 cây)
+
     def __init__(self, canvas=None, is_directed=True):
 # canvas: đối tượng giao diện dùng để VẼ ĐỒ THỊ (CƠ BẢN 1)
 # GraphLogic chỉ quản lý dữ liệu (nodes, raw_edges, adj) để hỗ trợ vẽ và lưu ( CƠ BẢN 2)
         self.canvas = canvas
         self.nodes = {}      # Lưu tọa độ: {'1': (x, y)}
+        self.grid = SpatialGrid(self.nodes)   # Chỉ mục lưới trên tọa độ: hit-test click + cắt viewport
         self.raw_edges = []  # [CORE] Source of truth: [('1', '2', 4)]
-        self.adj = {}        # Danh sách kề dùng để chạy thuật toán
+        self._edge_pos = {}  # Index (u, v) -> vị trí trong raw_edges, để upsert O(1)
+        # Cặp có cả 2 bản ghi (u, v) và (v, u): (min, max) -> bản ghi được ghi sau cùng. Ở Vô Hướng bản ghi này
+        # quyết định trọng số cạnh u-v, cả khi cập nhật dần lẫn khi dựng lại view (không phụ thuộc thứ tự raw_edges)
+        self._pair_last = {}
         self.is_directed = is_directed
+        # View kề theo chế độ: {is_directed: AdjacencyView}. View của chế độ kia build lười ở lần
+        # set_mode đầu tiên, từ đó cả 2 được cập nhật song song -> đổi chế độ O(1)
+        self._views = {is_directed: AdjacencyView(is_directed)}
+        self._view = self._views[is_directed]
+        self._heur_scale = None  # Cache hệ số heuristic A* (phụ thuộc cấu trúc + tọa độ)
+        self.version = 0     # Tăng sau mỗi thay đổi cấu trúc/chế độ -> các cache dẫn xuất chỉ hợp lệ trong 1 version
+        self._spt = OrderedDict()  # Cache LRU: chỉ số nguồn -> ShortestPathTree của version hiện tại
+        self._neg_edge = None      # Cache kết quả quét cạnh âm: None = chưa quét, () = không có, (u, v, w)
+        self._apsp = None          # Cache AllPairs của version hiện tại
+        self._summaries = None     # Cache source_summaries của version hiện tại
+
+    # Danh sách kề dùng để chạy thuật toán = của view đang dùng
+    adj = property(lambda self: self._view.adj)
+    radj = property(lambda self: self._view.radj)
+    adj_order = property(lambda self: self._view.order)
+
+    # --- THỐNG KÊ SỐNG (của view đang dùng) ---
+    def degree(self, nid): return self._view.degree(nid)
+
+    def out_degree(self, nid): return len(self.adj[nid])
+
+    def in_degree(self, nid): return len(self.radj[nid])
+
+    def min_weight(self): return self._view.min_weight()
+
+    def stats(self):
+        """Số liệu tổng hợp của đồ thị, đọc trong O(1) (dùng cho giám sát / kiểm tra điều kiện)"""
+        v = self._view
+        return {'nodes': len(self.nodes), 'edges': v.edge_count, 'directed': self.is_directed,
+                'negative_edges': v.neg_count, 'min_weight': v.min_weight(),
+                'odd_nodes': len(v.odd), 'unbalanced_nodes': len(v.unbalanced), 'version': self.version}
 
     # --- QUẢN LÝ DỮ LIỆU & MODE ---
     def set_mode(self, directed_mode):
-        """Đổi chế độ và tự động xây lại đồ thị"""
+        """Đổi chế độ: chỉ đổi view đang dùng (lần đầu mới phải dựng view kia từ raw_edges)"""
         if self.is_directed == directed_mode: return
-        self.is_directed = directed_mode
-        self.rebuild_adj() 
+        view = self._views.get(directed_mode)
+        if view is None: view = self._views[directed_mode] = self._build_view(directed_mode)
+        self.is_directed = directed_mode; self._view = view
+        self._bump()
+
+    def _build_view(self, directed):
+        edges = self.raw_edges
+        if not directed and self._pair_last:   # Bỏ bản ghi thua của mỗi cặp (u, v) / (v, u)
+            losers = {(v, u) for u, v in self._pair_last.values()}
+            edges = [e for e in edges if (e[0], e[1]) not in losers]
+        view = AdjacencyView(directed, self.nodes)
+        view.add_many(edges)
+        return view
+
     # CƠ BẢN 6: Chuyển lại adj từ raw_edges (danh sách cạnh -> danh sách kề)
     def rebuild_adj(self):
-        """Xóa sạch adj cũ, nạp lại từ raw_edges theo chế độ hiện tại"""
-        self.adj = {n: {} for n in self.nodes}
-        for u, v, w in self.raw_edges:
-            self._add_to_adj(u, v, w)
+        """Xóa sạch adj cũ, nạp lại từ raw_edges theo chế độ hiện tại (view chế độ kia build lại khi cần)"""
+        self._view = self._build_view(self.is_directed)
+        self._views = {self.is_directed: self._view}
+        self._invalidate()
+
+    def _bump(self):
+        """Sang version mới: bỏ các cache theo version (cây đường đi, quét cạnh âm, heuristic)"""
+        self.version += 1
+        self._heur_scale = None
+        self._spt.clear(); self._neg_edge = None; self._apsp = None; self._summaries = None
+
+    def _invalidate(self):
+        """Gọi sau MỌI thay đổi cấu trúc đồ thị: sang version mới, bỏ các cache dẫn xuất"""
+        self._bump()
+        for view in self._views.values(): view.csr = None
+
+    def get_csr(self):
+        """Snapshot CSR của adj hiện tại (build lười, dùng lại tới lần sửa đồ thị kế tiếp)"""
+        v = self._view
+        if v.csr is None: v.csr = CSRGraph(self.nodes, v.adj, v.is_directed, v.order)
+        return v.csr
 
     def add_node(self, nid, x, y):
         nid = str(nid)
-        self.nodes[nid] = (x, y)
-        if nid not in self.adj: self.adj[nid] = {}
+        if nid not in self.nodes: self._invalidate()
+        else: self._heur_scale = None
+        self.nodes[nid] = (x, y); self.grid.insert(nid, x, y)
+        for view in self._views.values(): view.add_node(nid)
+
+    def move_node(self, nid, x, y):
+        """Đổi tọa độ đỉnh (kéo thả): không đổi cấu trúc, chỉ bỏ cache phụ thuộc tọa độ"""
+        nid = str(nid)
+        if nid not in self.nodes: return
+        self.nodes[nid] = (x, y); self.grid.insert(nid, x, y); self._heur_scale = None
+
+    def node_at(self, x, y, r):
+        """Đỉnh gần điểm (x, y) nhất trong bán kính r (hit-test click), None nếu trúng chỗ trống"""
+        return self.grid.nearest(x, y, r)
+
+    def nodes_in_rect(self, x0, y0, x1, y1):
+        """Các đỉnh nằm trong hình chữ nhật [x0, x1] x [y0, y1]"""
+        return self.grid.query_rect(x0, y0, x1, y1)
 
     def add_edge(self, u, v, w=1):
         u, v = str(u), str(v)
         if u not in self.nodes or v not in self.nodes: return
-        
-        # 1. Update vào raw_edges (Gốc)
-        exists = False
-        for i, (ru, rv, rw) in enumerate(self.raw_edges):
-            if ru == u and rv == v:
-                self.raw_edges[i] = (u, v, w) 
-                exists = True
-                break
-        if not exists:
+        self._upsert_edge(u, v, w)
+        self._invalidate()
+
+    def add_edges(self, edges):
+        """Nạp hàng loạt cạnh (u, v, w) hoặc (u, v) trong 1 lượt. Trả về số cạnh hợp lệ đã nạp"""
+        batch = []
+        for e in edges:
+            if len(e) == 2: (u, v), w = e, 1
+            elif len(e) == 3: u, v, w = e
+            else: continue
+            u, v = str(u), str(v)
+            if u not in self.nodes or v not in self.nodes: continue
+            self._upsert_raw(u, v, w); batch.append((u, v, w))
+        if batch:
+            for view in self._views.values(): view.add_many(batch)   # Sort mỗi hàng 1 lần, không insort từng cạnh
+            self._invalidate()
+        return len(batch)
+
+    def _upsert_edge(self, u, v, w):
+        self._upsert_raw(u, v, w)
+        # 2. Update vào adj (Ngọn) của mọi view
+        for view in self._views.values(): view.add(u, v, w)
+
+    def _upsert_raw(self, u, v, w):
+        # 1. Update vào raw_edges (Gốc) - trùng (u, v) thì ghi đè tại chỗ
+        i = self._edge_pos.get((u, v))
+        if i is None:
+            self._edge_pos[(u, v)] = len(self.raw_edges)
             self.raw_edges.append((u, v, w))
+        else:
+            self.raw_edges[i] = (u, v, w)
+        # Ghi sau cùng thắng (khớp với view.add của bản ghi này ở view Vô Hướng)
+        if u != v and (v, u) in self._edge_pos: self._pair_last[(u, v) if u <= v else (v, u)] = (u, v)
 
-        # 2. Update vào adj (Ngọn)
-        self._add_to_adj(u, v, w)
+    def _drop_raw(self, u, v):
+        """Xóa (u, v) khỏi raw_edges trong O(1): đưa phần tử cuối vào chỗ trống"""
+        i = self._edge_pos.pop((u, v), None)
+        if i is None: return
+        self._pair_last.pop((u, v) if u <= v else (v, u), None)
+        last = self.raw_edges.pop()
+        if i < len(self.raw_edges):
+            self.raw_edges[i] = last
+            self._edge_pos[(last[0], last[1])] = i
 
-    def _add_to_adj(self, u, v, w):
-        if u not in self.adj: self.adj[u] = {}
-        self.adj[u][v] = w
-        # Nếu Vô Hướng -> Thêm chiều ngược lại
-        if not self.is_directed: 
-            if v not in self.adj: self.adj[v] = {}
-            self.adj[v][u] = w
+    def _remove_raw_edge(self, u, v):
+        """Xóa bản ghi (u, v) khỏi raw_edges và gỡ cung tương ứng ở mọi view"""
+        if (u, v) not in self._edge_pos: return
+        self._drop_raw(u, v)
+        for view in self._views.values():
+            if view.is_directed: view.unlink(u, v); continue
+            # Vô Hướng: còn bản ghi (v, u) thì cạnh u-v vẫn còn, mang trọng số của bản ghi đó
+            i = self._edge_pos.get((v, u))
+            if i is not None: view.add(v, u, self.raw_edges[i][2])
+            else: view.unlink(u, v); view.unlink(v, u)
+
+    def remove_edge(self, u, v):
+        """Xóa cạnh u->v (Vô Hướng: xóa cả u-v lẫn v-u). Chỉ tốn O(1)"""
+        u, v = str(u), str(v)
+        self._remove_raw_edge(u, v)
+        if not self.is_directed: self._remove_raw_edge(v, u)
+        self._invalidate()
 
     def remove_node(self, nid):
-        nid = str(nid)
-        if nid in self.nodes: del self.nodes[nid]
-        if nid in self.adj: del self.adj[nid]
-        # Xóa sạch trong raw_edges
-        self.raw_edges = [e for e in self.raw_edges if e[0] != nid and e[1] != nid]
-        for u in self.adj:
-            if nid in list(self.adj[u].keys()): del self.adj[u][nid]
+        self._remove_node(str(nid))
+        self._invalidate()
+
+    def remove_nodes(self, batch):
+        """Xóa hàng loạt đỉnh, chỉ đụng tới các cạnh kề của chúng"""
+        for nid in batch: self._remove_node(str(nid))
+        self._invalidate()
+
+    def _remove_node(self, nid):
+        # Mọi bản ghi raw chạm nid đều có đầu kia nằm trong adj/radj của nid: O(bậc)
+        self.nodes.pop(nid, None); self.grid.remove(nid)
+        view = self._view
+        for v in list(view.adj.get(nid, ())) + list(view.radj.get(nid, ())):
+            self._drop_raw(nid, v); self._drop_raw(v, nid)
+        for view in self._views.values(): view.remove_node(nid)
 
     # CƠ BẢN 6: Lấy ma trận kề từ danh sách kề (adj)
+    # Thứ tự đỉnh = thứ tự tự nhiên của snapshot CSR (đã cache, khỏi sort lại mỗi lần gọi)
     def get_matrix(self):
-        nodes = sorted(list(self.nodes.keys()), key=lambda x: int(x) if x.isdigit() else x)
-        n = len(nodes)
-        idx = {node: i for i, node in enumerate(nodes)}
-        mat = [[0] * n for _ in range(n)]
-        for u in self.adj:
-            for v, w in self.adj[u].items():
-                if u in idx and v in idx: mat[idx[u]][idx[v]] = w
-        return nodes, mat
+        """Ma trận kề dense dạng list of lists -> chỉ nên dùng cho đồ thị nhỏ"""
+        n = len(self.get_csr())
+        rows, _, mat = self.get_matrix_block(0, n, 0, n)
+        return rows, mat
+
+    def get_matrix_block(self, r0, r1, c0, c1):
+        """Khối con [r0:r1) x [c0:c1) của ma trận kề (dense) -> (đỉnh hàng, đỉnh cột, khối).
+        Mỗi hàng chỉ đọc các cạnh rơi vào [c0, c1) nhờ tìm nhị phân trên CSR"""
+        g = self.get_csr(); ids, off, tgt, wts = g.ids, g.offsets, g.targets, g.weights
+        n = len(g); r0, r1, c0, c1 = max(r0, 0), min(r1, n), max(c0, 0), min(c1, n)
+        block = []
+        for u in range(r0, r1):
+            row = [0] * max(c1 - c0, 0)
+            i = bisect_left(tgt, c0, off[u], off[u + 1])
+            while i < off[u + 1] and tgt[i] < c1: row[tgt[i] - c0] = wts[i]; i += 1
+            block.append(row)
+        return ids[r0:r1], ids[c0:c1], block
+
+    def get_sparse_matrix(self, fmt='csr'):
+        """Ma trận kề dạng thưa, dùng chung mảng với snapshot CSR (chỉ đọc, không copy).
+        fmt='csr': indptr/indices/data; fmt='coo': row/col/data (1 phần tử khác 0 mỗi cung)"""
+        g = self.get_csr(); n = len(g)
+        res = {'nodes': g.ids, 'shape': (n, n), 'nnz': len(g.targets)}
+        if fmt == 'csr':
+            res.update(indptr=g.offsets, indices=g.targets, data=g.weights)
+        elif fmt == 'coo':
+            row = array('l')
+            for u in range(n): row.extend([u] * (g.offsets[u + 1] - g.offsets[u]))
+            res.update(row=row, col=g.targets, data=g.weights)
+        else: raise ValueError(f"fmt phải là 'csr' hoặc 'coo', nhận {fmt!r}")
+        return res
+
+    def get_dense_matrix(self, dtype=None):
+        """Ma trận kề dense dạng numpy.ndarray (cần numpy) -> (nodes, mat).
+        dtype mặc định: kiểu nhỏ nhất chứa đủ trọng số (int8/16/32/64, float32 nếu không mất chính xác)"""
+        if np is None: raise ImportError('get_dense_matrix cần numpy (pip install numpy)')
+        m = self.get_sparse_matrix('coo')
+        row, col, data = (_as_ndarray(m[k]) for k in ('row', 'col', 'data'))
+        mat = np.zeros(m['shape'], dtype=dtype or _compact_dtype(data))
+        mat[row, col] = data
+        return m['nodes'], mat
     
     # CƠ BẢN 6: Lấy danh sách cạnh từ danh sách kề (adj)
     def get_edge_list(self):
-        edges = []
+        return list(self.iter_edges())
+
+    def iter_edges(self):
+        """Sinh lười từng cạnh (u, v, w) theo thứ tự của get_edge_list -> lấy vài dòng đầu (islice)
+        không phải dựng cả danh sách. Tổng số cạnh: stats()['edges']"""
         processed = set()
         for u in self.adj:
             for v, w in self.adj[u].items():
                 key = tuple(sorted((u, v))) if not self.is_directed else (u, v)
                 if not self.is_directed and key in processed: continue
                 processed.add(key)
-                edges.append((u, v, w))
-        return edges
+                yield u, v, w
 
-    # CƠ BẢN 4: Duyệt đồ thị theo chiến lược BFS 
-    def bfs(self, start):
+    # --- CHẾ ĐỘ CHẠY ---
+    # Mỗi thuật toán X có 2 lối vào:
+    #   iter_X(...): generator, yield từng Step khi cần (stream cho animate), return dict kết quả.
+    #                Ghi lại gọn bằng StepTrace: trace, res = StepTrace.record(g.iter_X(...))
+    #   X(..., trace=True): chạy hết, trả list steps; trace=False (result-only) KHÔNG tạo step nào,
+    #                       chỉ trả dict kết quả (dùng cho batch/server).
+    @staticmethod
+    def _drain(gen):
+        """Chạy hết generator -> (list step dict kiểu cũ, dict kết quả)"""
         steps = []
-        queue = deque([start])
-        visited = {start}
-        steps.append({'type': 'highlight', 'nodes': [start], 'desc': f'BFS Start: {start}'})
+        try:
+            while True: steps.append(next(gen).as_dict())
+        except StopIteration as stop:
+            return steps, stop.value
+
+    def _fail(self, tpl, trace, u=None, v=None, x=None):
+        """Báo lỗi: trace -> yield 1 step 'info'; kết quả luôn là {'error': msg}"""
+        if trace: yield Step('info', tpl, u, v, x)
+        return {'error': tpl.format(u=u, v=v, x=x)}
+
+    # CƠ BẢN 4: Duyệt đồ thị theo chiến lược BFS 
+    def bfs(self, start, trace=True):
+        steps, res = self._drain(self.iter_bfs(start, trace))
+        return steps if trace else res
+
+    def iter_bfs(self, start, trace=True):
+        g = self.get_csr(); ids, off, tgt = g.ids, g.offsets, g.targets
+        s = g.index[start]
+        queue = deque([s]); order = []
+        parent = array('l', [-1]) * len(g); hops = array('l', [-1]) * len(g); hops[s] = 0
+        if trace: yield Step('highlight', 'BFS Start: {u}', start)
         while queue:
-            u = queue.popleft()
-            steps.append({'type': 'current', 'node': u, 'desc': f'Pop {u}'})
-            if u in self.adj:
-                neighbors = sorted(self.adj[u].keys(), key=lambda x: int(x) if x.isdigit() else x)
-                for v in neighbors:
-                    if v not in visited:
-                        visited.add(v); queue.append(v)
-                        steps.append({'type': 'traverse', 'u': u, 'v': v, 'desc': f'Visit {v}'})
-        return steps
+            u = queue.popleft(); order.append(u)
+            if trace: yield Step('current', 'Pop {u}', ids[u])
+            for i in range(off[u], off[u + 1]):
+                v = tgt[i]
+                if hops[v] < 0:
+                    hops[v] = hops[u] + 1; parent[v] = u; queue.append(v)
+                    if trace: yield Step('traverse', 'Visit {v}', ids[u], ids[v])
+        return {'order': [ids[u] for u in order],
+                'parent': {ids[u]: (ids[parent[u]] if parent[u] >= 0 else None) for u in order},
+                'dist': {ids[u]: hops[u] for u in order}}
     
     # CƠ BẢN 4: Duyệt đồ thị theo chiến lược DFS
-    def dfs(self, start):
-        steps = []; visited = set()
-        def _visit(u):
-            visited.add(u)
-            steps.append({'type': 'highlight', 'nodes':[u], 'desc':f'DFS Visit {u}'})
-            neighbors = sorted(self.adj.get(u, {}).keys(), key=lambda x: int(x) if x.isdigit() else x)
-            for v in neighbors:
-                if v not in visited:
-                    steps.append({'type': 'traverse', 'u':u, 'v':v, 'desc':f'Go to {v}'})
-                    _visit(v)
-        _visit(start)
-        return steps
+    def dfs(self, start, trace=True):
+        steps, res = self._drain(self.iter_dfs(start, trace))
+        return steps if trace else res
+
+    def iter_dfs(self, start, trace=True):
+        g = self.get_csr(); ids = g.ids
+        walk = yield from self._dfs_walk(g, [g.index[start]], trace)
+        order, parent, pre, post = walk['order'], walk['parent'], walk['pre'], walk['post']
+        return {'order': [ids[u] for u in order],
+                'parent': {ids[u]: (ids[parent[u]] if parent[u] >= 0 else None) for u in order},
+                'pre': {ids[u]: pre[u] for u in order}, 'post': {ids[u]: post[u] for u in order}}
+
+    def _dfs_walk(self, g, roots, trace, stop_on_back=False):
+        """Engine DFS khử đệ quy (stack tường minh): cùng thứ tự thăm + trace với bản đệ quy,
+        không bao giờ chạm giới hạn đệ quy. Trả về mảng order/parent/pre/post (mốc thời gian
+        vào/ra), finish (thứ tự ra) và back = cạnh ngược đầu tiên (u, v) nếu có chu trình."""
+        ids, off, tgt = g.ids, g.offsets, g.targets
+        n = len(g); undirected = not g.is_directed
+        parent = array('l', [-1]) * n; pre = array('l', [-1]) * n; post = array('l', [-1]) * n
+        order = []; finish = []; clock = 0; back = None
+        for r in roots:
+            if pre[r] >= 0: continue
+            pre[r] = clock; clock += 1; order.append(r)
+            if trace: yield Step('highlight', 'DFS Visit {u}', ids[r])
+            stack_u = [r]; stack_i = [off[r]]   # đỉnh + vị trí cạnh kế tiếp cần xét
+            while stack_u:
+                u = stack_u[-1]; i = stack_i[-1]; end = off[u + 1]
+                while i < end:
+                    v = tgt[i]; i += 1
+                    if pre[v] < 0: break
+                    # v đang mở (chưa ra) -> cạnh ngược (Vô Hướng: bỏ qua cạnh cây về cha)
+                    if back is None and post[v] < 0 and not (undirected and v == parent[u]):
+                        back = (u, v)
+                        if stop_on_back: return {'order': order, 'parent': parent, 'pre': pre, 'post': post, 'finish': finish, 'back': back}
+                else:
+                    stack_u.pop(); stack_i.pop()
+                    post[u] = clock; clock += 1; finish.append(u)
+                    continue
+                stack_i[-1] = i
+                parent[v] = u; pre[v] = clock; clock += 1; order.append(v)
+                if trace:
+                    yield Step('traverse', 'Go to {v}', ids[u], ids[v])
+                    yield Step('highlight', 'DFS Visit {u}', ids[v])
+                stack_u.append(v); stack_i.append(off[v])
+        return {'order': order, 'parent': parent, 'pre': pre, 'post': post, 'finish': finish, 'back': back}
+
+    # Sắp xếp Topo (dựa trên engine DFS khử đệ quy)
+    def topological_sort(self, trace=True):
+        steps, res = self._drain(self.iter_topological_sort(trace))
+        return steps if trace else res
+
+    def iter_topological_sort(self, trace=True):
+        if not self.is_directed:
+            return (yield from self._fail('LỖI: Sắp xếp Topo chỉ áp dụng cho Đồ thị Có Hướng.', trace))
+        g = self.get_csr(); ids = g.ids
+        walk = yield from self._dfs_walk(g, range(len(g)), trace)
+        if walk['back']:
+            u, v = walk['back']
+            return (yield from self._fail('LỖI: Có chu trình ({u}->{v}), không sắp xếp Topo được.', trace, ids[u], ids[v]))
+        order = [ids[u] for u in reversed(walk['finish'])]
+        if trace: yield Step('path', 'Topo Order', None, None, None, order)
+        return {'order': order}
+
+    # Tìm chu trình (dựa trên engine DFS khử đệ quy, dừng ở cạnh ngược đầu tiên)
+    def find_cycle(self, trace=True):
+        steps, res = self._drain(self.iter_find_cycle(trace))
+        return steps if trace else res
+
+    def iter_find_cycle(self, trace=True):
+        g = self.get_csr(); ids = g.ids
+        walk = yield from self._dfs_walk(g, range(len(g)), trace, stop_on_back=True)
+        if not walk['back']:
+            if trace: yield Step('info', 'Không có chu trình')
+            return {'cycle': None}
+        u, v = walk['back']; parent = walk['parent']
+        cycle = [u]
+        while cycle[-1] != v: cycle.append(parent[cycle[-1]])
+        cycle = [ids[x] for x in reversed(cycle)] + [ids[v]]
+        if trace: yield Step('path', 'Tìm thấy chu trình (độ dài {x})', None, None, len(cycle) - 1, cycle)
+        return {'cycle': cycle}
 
     # CƠ BẢN 3: Thuật toán Dijkstra – Tìm đường đi ngắn nhất (CHẶN TRỌNG SỐ ÂM)
-    def dijkstra(self, start, end):
-        steps = []
+    # method: 'dijkstra' (mặc định) | 'astar' (heuristic Euclid từ tọa độ) | 'bidirectional' (2 chiều)
+    DIJKSTRA_METHODS = ('dijkstra', 'astar', 'bidirectional')
+
+    def dijkstra(self, start, end, trace=True, method='dijkstra'):
+        steps, res = self._drain(self.iter_dijkstra(start, end, trace, method))
+        return steps if trace else res
+
+    def iter_dijkstra(self, start, end, trace=True, method='dijkstra'):
+        if method not in self.DIJKSTRA_METHODS:
+            return (yield from self._fail('LỖI: Không có phương pháp {u}.', trace, method))
+        g = self.get_csr()
         
         # [CHECK] Kiểm tra trọng số âm
-        for u in self.adj:
-            for v, w in self.adj[u].items():
-                if w < 0:
-                    steps.append({'type': 'info', 'desc': f'LỖI: Phát hiện cạnh âm ({u}->{v}: {w}). Dijkstra không chạy được!'})
-                    return steps
+        neg = self._negative_edge(g)
+        if neg: return (yield from self._fail(self.NEG_EDGE_MSG, trace, *neg))
 
-        pq = [(0, start)]
-        dist = {n: float('inf') for n in self.nodes}
-        parent = {start: None}
-        dist[start] = 0
+        if method != 'dijkstra':
+            if end is None: return (yield from self._fail('LỖI: {u} cần có đỉnh đích.', trace, method))
+            search = self._astar_search if method == 'astar' else self._bidirectional_search
+            return (yield from search(g, start, end, trace))
+
+        # Result-only: trả lời từ cây đường đi ngắn nhất đầy đủ của start (tính 1 lần, cache theo version)
+        if not trace:
+            return self.shortest_path_tree(start).result(end)
+
+        # Trace (animate): end=None -> không dừng sớm, tính cả cây đường đi ngắn nhất từ start
+        ids = g.ids
+        s = g.index[start]; t = g.index[end] if end is not None else -1
+        yield Step('highlight', 'Dijkstra Start: {u} -> Target: {v}', start, end)
+        dist, parent, settled = yield from _dijkstra_core(g, s, t, True)
         
-        steps.append({'type': 'highlight', 'nodes': [start], 'desc': f'Dijkstra Start: {start} -> Target: {end}'})
+        path = yield from self._emit_path(ids, parent, s, t, dist[t] if t >= 0 else None, end, True)
+        # Chỉ trả khoảng cách của các đỉnh đã chốt (đã pop) -> đều là giá trị cuối cùng
+        return {'dist': {ids[u]: dist[u] for u in settled},
+                'parent': {ids[u]: (ids[parent[u]] if parent[u] >= 0 else None) for u in settled},
+                'path': path, 'cost': dist[t] if path else None, 'settled': len(settled)}
+
+    NEG_EDGE_MSG = 'LỖI: Phát hiện cạnh âm ({u}->{v}: {x}). Dijkstra không chạy được!'
+
+    def _negative_edge(self, g):
+        """Cạnh âm đầu tiên (u, v, w) theo thứ tự CSR, () nếu không có. Bộ đếm sống = 0 -> khỏi quét,
+        còn lại chỉ quét (để lấy cạnh báo lỗi) 1 lần mỗi version"""
+        if not self._view.neg_count: return ()
+        if self._neg_edge is None:
+            self._neg_edge = ()
+            for i, w in enumerate(g.weights):
+                if w < 0:
+                    self._neg_edge = (g.ids[g.edge_source(i)], g.ids[g.targets[i]], w); break
+        return self._neg_edge
+
+    def shortest_path_tree(self, start):
+        """ShortestPathTree đầy đủ từ start (Dijkstra, không dừng sớm). Cache LRU theo nguồn,
+        tự hết hạn khi đồ thị đổi version. Gọi sau khi đã chắc không có cạnh âm"""
+        g = self.get_csr(); s = g.index[start]
+        tree = self._spt.get(s)
+        if tree is not None:
+            self._spt.move_to_end(s)
+            return tree
+        if self._apsp is not None: tree = self._apsp.tree(start)   # đã có all-pairs -> đọc hàng có sẵn
+        else:
+            dist, parent, settled = self._drain(_dijkstra_core(g, s, -1, False))[1]
+            tree = ShortestPathTree(g, start, dist, parent, settled)
+        self._spt[s] = tree
+        limit = min(self.SPT_CACHE_SIZE, max(1, self.SPT_CACHE_NODES // max(1, len(g))))
+        while len(self._spt) > limit: self._spt.popitem(last=False)
+        return tree
+
+    # All-pairs: khoảng cách mọi cặp đỉnh + bao đóng bắc cầu, cache theo version
+    APSP_METHODS = ('auto', 'floyd', 'dijkstra', 'bfs', 'johnson')
+    APSP_DENSITY = 0.05     # auto: mật độ cạnh >= ngưỡng (và có numpy) -> Floyd–Warshall; thưa hơn -> Dijkstra/BFS lặp
+    APSP_FLOYD_MAX = 3000   # auto: quá số đỉnh này ma trận n x n quá nặng cho Floyd–Warshall
+    APSP_MAX_NODES = 4000   # Trần cứng: dist + pred n x n ~ 16 byte/ô -> ~256 MB ở 4000 đỉnh
+
+    def all_pairs(self, method='auto', cached_only=False, cancel=None):
+        """AllPairs của đồ thị hiện tại (cache tới lần sửa kế tiếp) hoặc {'error': msg}.
+        method: 'floyd' (numpy, chịu được cạnh âm) | 'johnson' (chịu được cạnh âm, không cần numpy)
+        | 'dijkstra' | 'bfs' (mọi trọng số = 1) | 'auto' (chọn theo mật độ / cạnh âm / có numpy hay không).
+        cached_only=True: chỉ trả kết quả đã tính (None nếu chưa có), không tính mới.
+        cancel: threading.Event, được xem sau mỗi nguồn / mỗi đỉnh trung gian; đặt -> {'error': CANCELLED_MSG}"""
+        if self._apsp is not None and method in ('auto', self._apsp.method): return self._apsp
+        if cached_only: return None
+        if method not in self.APSP_METHODS: return {'error': f'LỖI: Không có phương pháp {method}.'}
+        g = self.get_csr(); n = len(g); view = self._view
+        if n > self.APSP_MAX_NODES:
+            return {'error': f'LỖI: All-pairs giới hạn {self.APSP_MAX_NODES} đỉnh (đồ thị có {n}), ma trận n x n quá lớn.'}
+        unit = set(view.weights) <= {1}
+        if method == 'auto':
+            dense = n and len(g.targets) >= self.APSP_DENSITY * n * n and n <= self.APSP_FLOYD_MAX
+            if np is not None and dense: method = 'floyd'
+            elif view.neg_count: method = 'johnson'
+            else: method = 'bfs' if unit else 'dijkstra'
+        if method in ('floyd', 'johnson'):
+            if method == 'floyd' and np is None: return {'error': 'LỖI: Floyd–Warshall cần numpy (pip install numpy).'}
+            res = _floyd_warshall(g, cancel) if method == 'floyd' else _johnson_rows(g, cancel)
+            if _stop(cancel): return {'error': CANCELLED_MSG}
+            if res is None: return {'error': 'LỖI: Đồ thị có chu trình âm, không có khoảng cách ngắn nhất.'}
+            dist, pred = res
+        else:
+            if method == 'bfs' and not unit: return {'error': 'LỖI: BFS all-pairs chỉ dùng khi mọi trọng số = 1.'}
+            neg = self._negative_edge(g)
+            if neg: return {'error': self.NEG_EDGE_MSG.format(u=neg[0], v=neg[1], x=neg[2])}
+            dist = []; pred = []
+            for s in range(n):
+                if _stop(cancel): return {'error': CANCELLED_MSG}
+                row, parent = _sssp_row(g, s, method == 'bfs'); dist.append(row); pred.append(parent)
+        self._apsp = AllPairs(g, method, dist, pred)
+        return self._apsp
+
+    # Nhiều nguồn: eccentricity / đường kính / closeness = BFS/Dijkstra từ MỌI đỉnh, chia cho process pool
+    PARALLEL_MIN_WORK = 2_000_000   # n * (n + E) nhỏ hơn ngưỡng -> chạy tuần tự (rẻ hơn công dựng pool)
+
+    def source_summaries(self, workers=None, cancel=None):
+        """(rows, in_total, in_count) theo chỉ số CSR sau 1 lượt SSSP từ MỌI đỉnh (BFS nếu mọi trọng số = 1,
+        không thì Dijkstra): rows[s] = (ecc, số đỉnh tới được, tổng khoảng cách) của nguồn s,
+        in_total[v] / in_count[v] = tổng khoảng cách / số đỉnh ĐẾN được v. Cache tới lần sửa kế tiếp.
+        workers: số process (mặc định = số CPU); đồ thị nhỏ, 1 worker hoặc không mở được pool -> tuần tự.
+        Pool dùng 'spawn' (fork 1 process đang có nhiều thread, vd. app Tk + worker, không an toàn).
+        cancel: threading.Event, được xem sau mỗi nguồn (tuần tự) / mỗi CANCEL_POLL_SEC (pool); đặt -> {'error': CANCELLED_MSG}"""
+        if self._summaries is not None: return self._summaries
+        g = self.get_csr()
+        neg = self._negative_edge(g)
+        if neg: return {'error': self.NEG_EDGE_MSG.format(u=neg[0], v=neg[1], x=neg[2])}
+        unit = set(self._view.weights) <= {1}
+        n = len(g); workers = workers or os.cpu_count() or 1; res = None
+        if workers > 1 and n * (n + len(g.targets)) >= self.PARALLEL_MIN_WORK:
+            chunk = -(-n // (workers * 4))   # ~4 lô / worker để cân tải
+            jobs = [(range(i, min(i + chunk, n)), unit) for i in range(0, n, chunk)]
+            try:
+                pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=_init_worker, initargs=(g,))
+                try:
+                    futs = [pool.submit(_pool_summary_chunk, job) for job in jobs]
+                    pending = set(futs)
+                    while pending and not _stop(cancel):   # Chờ từng nhịp ngắn để Hủy có hiệu lực ngay
+                        pending = wait(pending, CANCEL_POLL_SEC, FIRST_COMPLETED)[1]
+                finally:   # Hủy: bỏ các lô chưa chạy, không chờ các lô đang chạy (chúng tự xong ở nền)
+                    pool.shutdown(wait=not _stop(cancel), cancel_futures=True)
+                if _stop(cancel): return {'error': CANCELLED_MSG}
+                parts = [f.result() for f in futs]
+                rows = [row for part in parts for row in part[0]]
+                in_total = array('d', [0]) * n; in_count = array('l', [0]) * n
+                for _, tot, cnt in parts:   # Gộp cột của các lô
+                    for j in range(n): in_total[j] += tot[j]; in_count[j] += cnt[j]
+                res = rows, in_total, in_count
+            except (OSError, BrokenProcessPool): pass
+        if res is None: res = _summary_chunk(g, range(n), unit, cancel)
+        if _stop(cancel): return {'error': CANCELLED_MSG}
+        self._summaries = res
+        return self._summaries
+
+    def _summary_value(self, x):
+        return int(x) if self.get_csr().weights.typecode == 'q' else x
+
+    def eccentricity(self, workers=None):
+        """{đỉnh: khoảng cách tới đỉnh xa nhất}; đỉnh không tới được mọi đỉnh khác -> inf (định nghĩa chuẩn)"""
+        res = self.source_summaries(workers)
+        if isinstance(res, dict): return res
+        n = len(res[0]); inf = float('inf')
+        return {nid: (self._summary_value(hi) if r == n else inf) for nid, (hi, r, _) in zip(self.get_csr().ids, res[0])}
+
+    def diameter(self, workers=None):
+        """{'diameter', 'radius', 'center', 'periphery'} từ eccentricity của mọi đỉnh.
+        Chỉ có nghĩa khi đồ thị liên thông (Có Hướng: liên thông mạnh), không thì trả lỗi"""
+        res = self.source_summaries(workers)   # Kiểm lỗi trên kết quả thô: đỉnh tên 'error' không bị nhầm
+        if isinstance(res, dict): return res
+        rows = res[0]; n = len(rows)
+        if not n: return {'error': 'LỖI: Đồ thị trống.'}
+        if any(r < n for _, r, _ in rows):
+            kind = 'liên thông mạnh' if self.is_directed else 'liên thông'
+            return {'error': f'LỖI: Đồ thị không {kind}, đường kính = ∞ (có đỉnh không tới được mọi đỉnh khác).'}
+        ecc = self.eccentricity(workers)
+        hi, lo = max(ecc.values()), min(ecc.values())
+        return {'diameter': hi, 'radius': lo,
+                'center': [u for u, e in ecc.items() if e == lo], 'periphery': [u for u, e in ecc.items() if e == hi]}
+
+    def closeness(self, workers=None):
+        """Closeness centrality {đỉnh: c} theo khoảng cách ĐẾN đỉnh (Có Hướng), chuẩn hóa Wasserman–Faust
+        cho đồ thị không liên thông: c = (r - 1)^2 / ((n - 1) * tổng), r = số đỉnh tới được nó.
+        Lấy từ cột của source_summaries -> dùng chung 1 lượt SSSP với eccentricity / diameter"""
+        res = self.source_summaries(workers)
+        if isinstance(res, dict): return res
+        _, in_total, in_count = res; n = len(in_total)
+        return {nid: ((r - 1) ** 2 / ((n - 1) * total) if total > 0 and n > 1 else 0.0)
+                for nid, r, total in zip(self.get_csr().ids, in_count, in_total)}
+
+    def shortest_paths(self, pairs):
+        """Trả lời hàng loạt truy vấn (nguồn, đích): gom theo nguồn, mỗi nguồn chỉ chạy Dijkstra 1 lần.
+        Trả list [{'source', 'target', 'path', 'cost'}] đúng thứ tự pairs (đỉnh lạ -> path rỗng)"""
+        g = self.get_csr()
+        neg = self._negative_edge(g)
+        if neg: return {'error': self.NEG_EDGE_MSG.format(u=neg[0], v=neg[1], x=neg[2])}
+        by_source = {}
+        pairs = [(str(u), str(v)) for u, v in pairs]
+        for k, (u, v) in enumerate(pairs): by_source.setdefault(u, []).append(k)
+        out = [None] * len(pairs)
+        for u, ks in by_source.items():
+            tree = self.shortest_path_tree(u) if u in g.index else None
+            for k in ks:
+                v = pairs[k][1]
+                path = tree.path(v) if tree else []
+                out[k] = {'source': u, 'target': v, 'path': path, 'cost': tree.cost(v) if path else None}
+        return out
 
+    def _emit_path(self, ids, parent, s, t, cost, end, trace):
+        """Dựng đường đi s -> t theo mảng parent, yield step 'path' (hoặc 'info' nếu không tới được).
+        end=None (chạy cả cây, không có đích) -> không yield gì"""
+        path = []
+        if t >= 0 and cost is not None and cost != float('inf'):
+            curr = t
+            while curr != -1: path.append(ids[curr]); curr = parent[curr]
+            path.reverse()
+            if trace: yield Step('path', 'Shortest Path: {x}', None, None, cost, path)
+        elif trace and end is not None:
+            yield Step('info', 'Không tìm thấy đường đi tới {v}', None, end)
+        return path
+
+    def _astar_scale(self, g):
+        """Hệ số c để h(v) = c * |v - đích| (Euclid theo tọa độ đỉnh) luôn chấp nhận được:
+        c = min(w / độ dài) trên mọi cạnh => h(u) <= w(u, v) + h(v), không bao giờ đánh giá quá"""
+        if self._heur_scale is None:
+            pos = self.nodes; ids, off, tgt, wts = g.ids, g.offsets, g.targets, g.weights
+            scale = float('inf')
+            for u in range(len(g)):
+                ux, uy = pos[ids[u]]
+                for i in range(off[u], off[u + 1]):
+                    vx, vy = pos[ids[tgt[i]]]
+                    d = math.hypot(ux - vx, uy - vy)
+                    if d > 0 and wts[i] < scale * d: scale = wts[i] / d
+            self._heur_scale = scale if scale != float('inf') else 0
+        return self._heur_scale
+
+    def _astar_search(self, g, start, end, trace):
+        ids, off, tgt, wts = g.ids, g.offsets, g.targets, g.weights
+        s, t = g.index[start], g.index[end]
+        scale = self._astar_scale(g); pos = self.nodes; tx, ty = pos[end]
+        def h(v):
+            x, y = pos[ids[v]]
+            return scale * math.hypot(x - tx, y - ty)
+        dist = [float('inf')] * len(g); dist[s] = 0
+        parent = array('l', [-1]) * len(g); closed = bytearray(len(g))
+        pq = [(h(s), s)]; settled = []
+        if trace: yield Step('highlight', 'A* Start: {u} -> Target: {v}', start, end)
         while pq:
+            _, u = heapq.heappop(pq)
+            if closed[u]: continue
+            closed[u] = 1; settled.append(u); d = dist[u]
+            if trace: yield Step('current', 'Xét {u} (min={x})', ids[u], None, d)
+            if u == t: break
+            for i in range(off[u], off[u + 1]):
+                v = tgt[i]; new_cost = d + wts[i]
+                if not closed[v] and new_cost < dist[v]:
+                    dist[v] = new_cost; parent[v] = u
+                    heapq.heappush(pq, (new_cost + h(v), v))
+                    if trace: yield Step('relax', 'Relax {v}={x}', ids[u], ids[v], new_cost)
+        path = yield from self._emit_path(ids, parent, s, t, dist[t], end, trace)
+        return {'dist': {ids[u]: dist[u] for u in settled},
+                'parent': {ids[u]: (ids[parent[u]] if parent[u] >= 0 else None) for u in settled},
+                'path': path, 'cost': dist[t] if path else None, 'settled': len(settled)}
+
+    def _bidirectional_search(self, g, start, end, trace):
+        ids = g.ids; n = len(g); inf = float('inf')
+        s, t = g.index[start], g.index[end]
+        rg = g.reverse()   # chiều ngược đi trên cạnh vào
+        # Mỗi chiều: (csr, dist, parent, heap, closed). Chiều 0 từ s, chiều 1 từ t
+        side = [(g, [inf] * n, array('l', [-1]) * n, [(0, s)], bytearray(n)),
+                (rg, [inf] * n, array('l', [-1]) * n, [(0, t)], bytearray(n))]
+        side[0][1][s] = 0; side[1][1][t] = 0
+        best = inf; meet = s if s == t else -1; settled = 0; fwd_done = []
+        if s == t: best = 0
+        if trace: yield Step('highlight', 'Dijkstra 2 chiều: {u} <-> {v}', start, end, None, [start, end])
+        while side[0][3] and side[1][3]:
+            # Dừng khi top(trước) + top(sau) >= đường tốt nhất đã gặp
+            if side[0][3][0][0] + side[1][3][0][0] >= best: break
+            k = 0 if side[0][3][0][0] <= side[1][3][0][0] else 1
+            cg, dist, parent, pq, closed = side[k]; other = side[1 - k][1]
             d, u = heapq.heappop(pq)
-            if d > dist[u]: continue
-            
-            steps.append({'type': 'current', 'node': u, 'desc': f'Xét {u} (min={d})'})
-            if u == end: break
-            
-            neighbors = sorted(self.adj.get(u, {}).items(), key=lambda item: int(item[0]) if item[0].isdigit() else item[0])
-            for v, w in neighbors:
-                new_cost = dist[u] + w
+            if closed[u]: continue
+            closed[u] = 1; settled += 1
+            if k == 0: fwd_done.append(u)
+            if trace: yield Step('current', 'Xét {u} (min={x})' if k == 0 else 'Xét ngược {u} (min={x})', ids[u], None, d)
+            off, tgt, wts = cg.offsets, cg.targets, cg.weights
+            for i in range(off[u], off[u + 1]):
+                v = tgt[i]; new_cost = d + wts[i]
                 if new_cost < dist[v]:
                     dist[v] = new_cost; parent[v] = u
                     heapq.heappush(pq, (new_cost, v))
-                    steps.append({'type': 'relax', 'u': u, 'v': v, 'desc': f'Relax {v}={new_cost}'})
-        
+                    if trace:
+                        if k == 0: yield Step('relax', 'Relax {v}={x}', ids[u], ids[v], new_cost)
+                        else: yield Step('relax', 'Relax ngược {u}={x}', ids[v], ids[u], new_cost)
+                if other[v] != inf and dist[v] + other[v] < best:
+                    best = dist[v] + other[v]; meet = v
         path = []
-        if dist[end] != float('inf'):
-            curr = end
-            while curr is not None: path.append(curr); curr = parent.get(curr)
-            path.reverse()
-            steps.append({'type': 'path', 'nodes': path, 'desc': f'Shortest Path: {dist[end]}'})
-        else:
-             steps.append({'type': 'info', 'desc': f'Không tìm thấy đường đi tới {end}'})
-             
-        return steps
+        if meet >= 0:
+            pf, pb = side[0][2], side[1][2]
+            curr = meet
+            while curr != -1: path.append(ids[curr]); curr = pf[curr]
+            path.reverse(); curr = pb[meet]
+            while curr != -1: path.append(ids[curr]); curr = pb[curr]
+            if trace: yield Step('path', 'Shortest Path: {x}', None, None, best, path)
+        elif trace:
+            yield Step('info', 'Không tìm thấy đường đi tới {v}', None, end)
+        dist, parent = side[0][1], side[0][2]
+        return {'dist': {ids[u]: dist[u] for u in fwd_done},
+                'parent': {ids[u]: (ids[parent[u]] if parent[u] >= 0 else None) for u in fwd_done},
+                'path': path, 'cost': best if path else None, 'settled': settled}
 
     # --- THUẬT TOÁN BỊ CHẶN Ở CHẾ ĐỘ CÓ HƯỚNG ---
 
-    #CƠ BẢN 5: Kiểm tra một đồ thị có phải là đồ thị 2 phía không?
-    def check_bipartite(self):
-        steps = []
+    #CƠ BẢN 5: Kiểm tra một đồ thị có phải là đồ thị 2 phía không?
+    def check_bipartite(self, trace=True):
+        steps, res = self._drain(self.iter_check_bipartite(trace))
+        if not trace: return res
+        if 'error' in res: return False, steps, None
+        return res['bipartite'], steps, {nid: COLOR_MAP_BIPARTITE[c] for nid, c in res['coloring'].items()}
+
+    def iter_check_bipartite(self, trace=True):
         # [BLOCK] Bipartite Check
         if self.is_directed:
-            steps.append({'type': 'info', 'desc': 'LỖI: Kiểm tra 2 phía chỉ dành cho Đồ thị Vô Hướng.'})
-            return False, steps, None
+            return (yield from self._fail('LỖI: Kiểm tra 2 phía chỉ dành cho Đồ thị Vô Hướng.', trace))
 
-        colors = {}
-        for start in self.nodes:
+        colors = {}; ok = True
+        for start in list(self.nodes):
+            if not ok: break
             if start not in colors:
                 colors[start] = 0
-                steps.append({'type': 'color', 'node': start, 'color': 0, 'desc': 'start group A'})
+                if trace: yield Step('color', 'start group A', start, None, 0)
                 queue = deque([start])
-                while queue:
+                while queue and ok:
                     u = queue.popleft()
-                    neighbors = sorted(self.adj.get(u, {}).keys(), key=lambda x: int(x) if x.isdigit() else x)
-                    for v in neighbors:
+                    for v in self.adj_order.get(u, ()):
                         if v not in colors:
                             colors[v] = 1 - colors[u]
-                            steps.append({'type': 'color', 'node': v, 'color': colors[v], 'desc': 'paint'})
+                            if trace: yield Step('color', 'paint', v, None, colors[v])
                             queue.append(v)
                         elif colors[v] == colors[u]:
-                            return False, steps, {nid: COLOR_MAP_BIPARTITE[c] for nid, c in colors.items()}
-        return True, steps, {nid: COLOR_MAP_BIPARTITE[c] for nid, c in colors.items()}
+                            ok = False; break
+        return {'bipartite': ok, 'coloring': colors}
 
     # NÂNG CAO 7.1: Thuật toán PRIM 
-    def prim(self, start_node=None):
-        steps = []
+    def prim(self, start_node=None, trace=True):
+        steps, res = self._drain(self.iter_prim(start_node, trace))
+        return steps if trace else res
+
+    def iter_prim(self, start_node=None, trace=True):
         # [BLOCK] Prim MST
         if self.is_directed:
-            steps.append({'type': 'info', 'desc': 'LỖI: Prim (MST) chỉ áp dụng cho Đồ thị Vô Hướng.'})
-            return steps
+            return (yield from self._fail('LỖI: Prim (MST) chỉ áp dụng cho Đồ thị Vô Hướng.', trace))
             
-        if not self.nodes: return steps
+        mst = []
+        if not self.nodes: return {'edges': mst, 'weight': 0}
         start = start_node if start_node else list(self.nodes.keys())[0]
-        visited = {start}; edges = []
-        for v, w in self.adj.get(start, {}).items(): heapq.heappush(edges, (w, start, v))
-        steps.append({'type': 'highlight', 'nodes': [start], 'desc': 'Prim Start'})
-        while edges:
-            w, u, v = heapq.heappop(edges)
-            if v in visited: continue
-            visited.add(v)
-            steps.append({'type': 'traverse', 'u': u, 'v': v, 'desc': f'Add Edge {u}-{v}'})
-            for nv, nw in self.adj.get(v, {}).items():
-                if nv not in visited: heapq.heappush(edges, (nw, v, nv))
-        return steps
+        g = self.get_csr(); ids, off, tgt, wts = g.ids, g.offsets, g.targets, g.weights
+        s = g.index[start]
+        # Khóa của đỉnh ngoài cây = (w, u): cạnh nhẹ nhất nối vào cây, hòa thì u nhỏ hơn
+        visited = bytearray(len(g)); visited[s] = 1
+        pq = IndexedHeap(len(g))
+        for i in range(off[s], off[s + 1]):
+            if tgt[i] != s: pq.push(tgt[i], (wts[i], s))
+        if trace: yield Step('highlight', 'Prim Start', start)
+        while pq:
+            (w, u), v = pq.pop()
+            visited[v] = 1; mst.append((ids[u], ids[v], w))
+            if trace: yield Step('traverse', 'Add Edge {u}-{v}', ids[u], ids[v])
+            for i in range(off[v], off[v + 1]):
+                nv = tgt[i]
+                if not visited[nv]: pq.push(nv, (wts[i], v))
+        return {'edges': mst, 'weight': sum(e[2] for e in mst)}
     
     #NÂNG CAO 7.2: Thuật toán KRUSKAL
-    def kruskal(self): 
-        steps = []
+    def kruskal(self, trace=True): 
+        steps, res = self._drain(self.iter_kruskal(trace))
+        return steps if trace else res
+
+    def iter_kruskal(self, trace=True):
         # [BLOCK] Kruskal MST
         if self.is_directed:
-            steps.append({'type': 'info', 'desc': 'LỖI: Kruskal (MST) chỉ áp dụng cho Đồ thị Vô Hướng.'})
-            return steps
+            return (yield from self._fail('LỖI: Kruskal (MST) chỉ áp dụng cho Đồ thị Vô Hướng.', trace))
 
-        edges = set()
-        for u in self.adj:
-            for v, w in self.adj[u].items():
-                if u < v: edges.add((w, u, v)) # Chỉ lấy 1 chiều để không trùng
-        sorted_edges = sorted(list(edges), key=lambda x: (x[0], x[1], x[2]))
-        
-        parent = {n: n for n in self.nodes}
-        def find(n): return find(parent[n]) if parent[n] != n else n
-        def union(n1, n2):
-            r1, r2 = find(n1), find(n2)
-            if r1 != r2: parent[r1] = r2; return True
-            return False
+        g = self.get_csr(); ids, off, tgt, wts = g.ids, g.offsets, g.targets, g.weights
+        n = len(g)
+        # Chỉ lấy 1 chiều (u < v theo chỉ số) để không trùng. CSR đã xếp theo (u, v)
+        # -> sort ổn định chỉ theo trọng số là đủ ra thứ tự (w, u, v), sort 1 lần trên chỉ số cạnh
+        eu = array('l'); ev = array('l'); ew = array(wts.typecode)
+        for u in range(n):
+            for i in range(off[u], off[u + 1]):
+                if u < tgt[i]: eu.append(u); ev.append(tgt[i]); ew.append(wts[i])
+        order = sorted(range(len(ew)), key=ew.__getitem__)
         
-        for w, u, v in sorted_edges:
-            if union(u, v): steps.append({'type': 'traverse', 'u': u, 'v': v, 'desc': f'Kruskal picks {u}-{v}'})
-        return steps
+        ds = DisjointSet(n)
+        mst = []
+        for k in order:
+            if ds.count <= 1: break   # đủ V-1 cạnh -> dừng sớm
+            u, v = eu[k], ev[k]
+            if ds.union(u, v):
+                mst.append((ids[u], ids[v], ew[k]))
+                if trace: yield Step('traverse', 'Kruskal picks {u}-{v}', ids[u], ids[v])
+        # Không liên thông -> mỗi thành phần 1 cây khung (rừng khung)
+        comp = {}; forests = []
+        for u in range(n):
+            r = ds.find(u)
+            if r not in comp:
+                comp[r] = len(forests); forests.append({'nodes': [], 'edges': [], 'weight': 0})
+            forests[comp[r]]['nodes'].append(ids[u])
+        for e in mst:
+            f = forests[comp[ds.find(g.index[e[0]])]]
+            f['edges'].append(e); f['weight'] += e[2]
+        if trace and len(forests) > 1: yield Step('info', 'Đồ thị không liên thông: rừng khung gồm {x} cây', None, None, len(forests))
+        return {'edges': mst, 'weight': sum(e[2] for e in mst), 'forests': forests}
 
     # NÂNG CAO 7.3: Thuật toán FORD–FULKERSON
-    def ford_fulkerson(self, source, sink):
-        steps = []
+    # method: 'edmonds_karp' (mặc định, BFS từng đường tăng) | 'dinic' (đồ thị tầng + luồng chặn)
+    #         | 'push_relabel' (đẩy-nâng nhãn FIFO). Cả 3 chạy trên FlowNetwork dạng mảng
+    FLOW_METHODS = ('edmonds_karp', 'dinic', 'push_relabel')
+
+    def ford_fulkerson(self, source, sink, trace=True, method='edmonds_karp'):
+        steps, res = self._drain(self.iter_ford_fulkerson(source, sink, trace, method))
+        return steps if trace else res
+
+    def iter_ford_fulkerson(self, source, sink, trace=True, method='edmonds_karp'):
         # Ford-Fulkerson chạy được cả 2, nhưng thường dùng cho Có Hướng.
         # Ở đây KHÔNG CHẶN, để nó chạy bình thường.
-        residual = {u: {v: w for v, w in self.adj.get(u, {}).items()} for u in self.adj}
+        if method not in self.FLOW_METHODS:
+            return (yield from self._fail('LỖI: Không có phương pháp {u}.', trace, method))
+        if source == sink:
+            return (yield from self._fail('LỖI: Nguồn và đích phải khác nhau.', trace))
+        g = self.get_csr()
+        net = FlowNetwork(g); s, t = g.index[source], g.index[sink]
+        engine = {'edmonds_karp': self._edmonds_karp, 'dinic': self._dinic, 'push_relabel': self._push_relabel}[method]
+        max_flow, source_side = yield from engine(g.ids, net, s, t, trace)
+        res = {'max_flow': max_flow}; res.update(net.min_cut(g.ids, source_side))
+        return res
+
+    def _augment(self, ids, net, s, t, path_arcs, max_flow, trace):
+        """Đẩy luồng dọc đường tăng (danh sách cung s -> t), yield step 'path' + 'info' như Edmonds-Karp"""
+        to, cap = net.to, net.cap
+        path_flow = min(cap[a] for a in path_arcs)
+        for a in path_arcs: cap[a] -= path_flow; cap[a ^ 1] += path_flow
+        max_flow += path_flow
+        if trace:
+            yield Step('path', 'Flow +{x}', None, None, path_flow, [ids[s]] + [ids[to[a]] for a in path_arcs])
+            yield Step('info', 'Max Flow: {x}', None, None, max_flow)
+        return max_flow
+
+    def _edmonds_karp(self, ids, net, s, t, trace):
+        # BFS xét cung của u theo thứ tự của FlowNetwork: cạnh ra theo thứ tự tự nhiên của đích (như CSR),
+        # rồi mới tới cung ngược. Bản dict gốc xét theo thứ tự thêm cạnh -> khi có nhiều đường tăng cùng độ dài,
+        # đường được chọn (và trace) có thể khác bản gốc; max_flow và giá trị lát cắt thì như nhau
+        to, cap, first, arcs, n = net.to, net.cap, net.first, net.arcs, net.n
         max_flow = 0
         while True:
-            parent = {n: None for n in self.nodes}
-            queue = deque([source]); found = False
+            parent_arc = array('l', [-1]) * n
+            seen = bytearray(n); seen[s] = 1
+            queue = deque([s]); found = False
             while queue:
                 u = queue.popleft()
-                if u == sink: found = True; break
-                for v, cap in residual.get(u, {}).items():
-                    if parent[v] is None and cap > 0 and v != source:
-                        parent[v] = u; queue.append(v)
+                if u == t: found = True; break
+                for k in range(first[u], first[u + 1]):
+                    a = arcs[k]; v = to[a]
+                    if not seen[v] and cap[a] > 0:
+                        seen[v] = 1; parent_arc[v] = a; queue.append(v)
             if not found: break 
-            path_flow = float('inf'); v = sink; path = [sink]
-            while v != source:
-                u = parent[v]; path_flow = min(path_flow, residual[u][v]); v = u; path.append(v)
-            max_flow += path_flow
-            steps.append({'type': 'path', 'nodes': path[::-1], 'desc': f'Flow +{path_flow}'})
-            v = sink
-            while v != source:
-                u = parent[v]; residual[u][v] -= path_flow
-                if v not in residual: residual[v] = {}
-                if u not in residual[v]: residual[v][u] = 0
-                residual[v][u] += path_flow; v = u
-            steps.append({'type': 'info', 'desc': f'Max Flow: {max_flow}'})
-        return steps
+            path_arcs = []; v = t
+            while v != s: a = parent_arc[v]; path_arcs.append(a); v = to[a ^ 1]
+            max_flow = yield from self._augment(ids, net, s, t, path_arcs[::-1], max_flow, trace)
+        # Lát cắt hẹp nhất: 'seen' của lần BFS cuối = phía nguồn trong residual
+        return max_flow, seen
+
+    def _dinic(self, ids, net, s, t, trace):
+        to, cap, first, arcs, n = net.to, net.cap, net.first, net.arcs, net.n
+        max_flow = 0
+        while True:
+            # 1. BFS dựng đồ thị tầng trên residual
+            level = array('l', [-1]) * n; level[s] = 0; queue = deque([s])
+            while queue:
+                u = queue.popleft()
+                for k in range(first[u], first[u + 1]):
+                    a = arcs[k]; v = to[a]
+                    if level[v] < 0 and cap[a] > 0: level[v] = level[u] + 1; queue.append(v)
+            if level[t] < 0: break
+            # Mỗi pha tầng của t tăng ngặt -> x = level[t] cũng là số đo tiến độ (u để trống: u/v là id đỉnh)
+            if trace: yield Step('info', 'Dinic pha mới: đồ thị tầng, {v} ở tầng {x}', None, ids[t], level[t])
+            # 2. Luồng chặn: DFS khử đệ quy theo tầng, it[u] = cung kế tiếp của u (không xét lại cung chết)
+            it = array('l', first[:n]); stack = []; u = s
+            while True:
+                if u == t:
+                    max_flow = yield from self._augment(ids, net, s, t, stack, max_flow, trace)
+                    stack = []; u = s
+                    continue
+                end = first[u + 1]; k = it[u]
+                while k < end:
+                    a = arcs[k]; v = to[a]
+                    if cap[a] > 0 and level[v] == level[u] + 1: break
+                    k += 1
+                it[u] = k
+                if k < end: stack.append(a); u = v; continue
+                # u cụt -> bỏ khỏi đồ thị tầng, lùi về đỉnh trước
+                if u == s: break
+                level[u] = -1; a = stack.pop(); u = to[a ^ 1]; it[u] += 1
+        return max_flow, net.reachable(s)
+
+    def _push_relabel(self, ids, net, s, t, trace):
+        """Đẩy-nâng nhãn FIFO + cung hiện tại + heuristic khe (gap). Chỉ chạy pha 1 (tiền luồng cực đại):
+        luồng cực đại = dư ở t, lát cắt = các đỉnh KHÔNG còn tới được t trong residual"""
+        to, cap, first, arcs, n = net.to, net.cap, net.first, net.arcs, net.n
+        # Nhãn ban đầu = khoảng cách BFS ngược tới t (global relabel); không tới được -> n
+        height = array('l', [n]) * n; height[t] = 0; queue = deque([t])
+        while queue:
+            w = queue.popleft()
+            for k in range(first[w], first[w + 1]):
+                b = arcs[k] ^ 1; x = to[b ^ 1]
+                if height[x] == n and x != t and cap[b] > 0: height[x] = height[w] + 1; queue.append(x)
+        height[s] = n
+        count = array('l', [0]) * (2 * n + 1)
+        for u in range(n): count[height[u]] += 1
+        excess = [0] * n; active = deque(); it = array('l', first[:n])
+        # Bão hòa mọi cạnh ra từ s
+        for k in range(first[s], first[s + 1]):
+            a = arcs[k]; f = cap[a]
+            if f > 0:
+                v = to[a]; cap[a] -= f; cap[a ^ 1] += f; excess[v] += f; excess[s] -= f
+                if v != t and excess[v] == f: active.append(v)
+                if trace: yield Step('info', 'Đẩy {x}: {u} -> {v}', ids[s], ids[v], f)
+        while active:
+            u = active.popleft()
+            while excess[u] > 0 and height[u] < n:
+                k = it[u]; end = first[u + 1]
+                if k == end:
+                    # Nâng nhãn: 1 + nhãn thấp nhất trong các đỉnh kề còn cap
+                    old = height[u]; h = 2 * n
+                    for j in range(first[u], end):
+                        a = arcs[j]
+                        if cap[a] > 0 and height[to[a]] + 1 < h: h = height[to[a]] + 1
+                    count[old] -= 1; height[u] = h; count[h] += 1; it[u] = first[u]
+                    if trace: yield Step('info', 'Nâng nhãn {u}: {x}', ids[u], None, h)
+                    if count[old] == 0 and old < n:
+                        # Khe: không còn đỉnh nào ở nhãn old -> mọi đỉnh cao hơn (dưới n) hết đường tới t
+                        for x in range(n):
+                            if old < height[x] < n: count[height[x]] -= 1; height[x] = n + 1; count[n + 1] += 1
+                    continue
+                a = arcs[k]; v = to[a]
+                if cap[a] > 0 and height[u] == height[v] + 1:
+                    f = min(excess[u], cap[a])
+                    cap[a] -= f; cap[a ^ 1] += f; excess[u] -= f; excess[v] += f
+                    if v != s and v != t and excess[v] == f: active.append(v)
+                    if trace: yield Step('info', 'Đẩy {x}: {u} -> {v}', ids[u], ids[v], f)
+                else: it[u] = k + 1
+        max_flow = excess[t]
+        if trace: yield Step('info', 'Max Flow: {x}', None, None, max_flow)
+        sink_side = net.reaching(t)
+        return max_flow, bytearray(1 - x for x in sink_side)
 
     # NÂNG CAO 7.4: Thuật toán FLEURY 
-    def fleury(self, start_node=None):
-        steps = []
+    def fleury(self, start_node=None, trace=True):
+        steps, res = self._drain(self.iter_fleury(start_node, trace))
+        return steps if trace else res
+
+    def iter_fleury(self, start_node=None, trace=True):
         # [BLOCK] Fleury
         if self.is_directed:
-             steps.append({'type': 'info', 'desc': 'LỖI: Fleury (Euler) chỉ áp dụng cho Đồ thị Vô Hướng.'})
-             return steps 
+             return (yield from self._fail('LỖI: Fleury (Euler) chỉ áp dụng cho Đồ thị Vô Hướng.', trace))
         
-        if not self.nodes: return steps
+        if not self.nodes: return {'path': []}
         
         # Logic Vô Hướng
-        odd = [u for u in self.adj if len(self.adj[u]) % 2 != 0]
+        odd = self._view.odd   # tập đỉnh bậc lẻ được duy trì sẵn, khỏi quét lại
         if len(odd) > 2:
-             steps.append({'type': 'info', 'desc': 'LỖI: Không thỏa mãn đk Euler (Số đỉnh bậc lẻ > 2)'})
-             return steps
+             return (yield from self._fail('LỖI: Không thỏa mãn đk Euler (Số đỉnh bậc lẻ > 2)', trace))
              
-        temp_adj = {u: list(v.keys()) for u, v in self.adj.items()} 
-        start_node = odd[0] if odd else list(self.nodes.keys())[0]
-        curr = start_node; path = [curr]
-        steps.append({'type': 'highlight', 'nodes': [curr], 'desc': f'Start Fleury: {curr}'})
+        g = self.get_csr(); ids, off, tgt = g.ids, g.offsets, g.targets
+        n = len(g); m = len(tgt)
+        twin = self._twin_arcs(g)
+        used = bytearray(m)                  # cung đã đi qua (đánh dấu cả 2 chiều)
+        ptr = array('l', off[:n])            # mọi cung trước ptr[u] đều đã dùng
+        bridge = self._bridges(g, twin)      # Cầu của đồ thị ban đầu: xóa cạnh không bao giờ biến cầu thành không-cầu
+        left = self._view.edge_count   # số cạnh còn lại
+        mark = array('l', [0]) * n; stamp = 0
+
+        def still_connected(a, b):
+            """Sau khi bỏ cạnh a-b, a còn tới được b không? BFS 2 phía xen kẽ từ a và b:
+            gặp nhau -> còn nối (không phải cầu); 1 phía cạn trước -> cầu. Chi phí ~ 2 x phía nhỏ hơn"""
+            nonlocal stamp
+            stamp += 1; mark[a] = stamp; mark[b] = -stamp
+            fronts = ([a], [b]); heads = [0, 0]
+            while heads[0] < len(fronts[0]) and heads[1] < len(fronts[1]):
+                for k in (0, 1):
+                    q = fronts[k]; x = q[heads[k]]; heads[k] += 1
+                    mine = stamp if k == 0 else -stamp
+                    for i in range(ptr[x], off[x + 1]):
+                        if used[i]: continue
+                        y = tgt[i]
+                        if mark[y] == -mine: return True
+                        if mark[y] != mine: mark[y] = mine; q.append(y)
+                    if heads[k] >= len(q): return False
+            return False
+
+        def is_bridge(u, i):
+            v = tgt[i]
+            if bridge[i]: return True
+            if v == u: return False   # khuyên không bao giờ là cầu
+            j = twin[i]; used[i] = used[j] = 1
+            cut = not still_connected(u, v)
+            used[i] = used[j] = 0
+            if cut: bridge[i] = bridge[j] = 1
+            return cut
+
+        # Đỉnh đầu: đỉnh user chọn nếu hợp lệ (là đỉnh lẻ / có cạnh), không thì đỉnh lẻ nhỏ nhất / đỉnh có cạnh đầu tiên
+        start_node = str(start_node) if start_node is not None else None
+        if odd: start_node = start_node if start_node in odd else min(odd, key=_natural_key)
+        elif not self.adj.get(start_node): start_node = next((u for u in self.nodes if self.adj[u]), next(iter(self.nodes)))
+        curr = start_node; path = [curr]; cu = g.index[curr]
+        if trace: yield Step('highlight', 'Start Fleury: {u}', curr)
         
-        while any(temp_adj.values()): 
-            neighbors = sorted(temp_adj.get(curr, []), key=lambda x: int(x) if x.isdigit() else x)
-            chosen_v = None
-            if len(neighbors) == 1: chosen_v = neighbors[0]
-            else:
-                for v in neighbors:
-                    temp_adj[curr].remove(v)
-                    if curr in temp_adj.get(v, []): temp_adj[v].remove(curr)
-                    # Check cầu
-                    def count_reachable(start_n):
-                        q = deque([start_n]); seen = {start_n}; cnt = 0
-                        while q:
-                            c = q.popleft(); cnt+=1
-                            for nxt in temp_adj.get(c, []):
-                                if nxt not in seen: seen.add(nxt); q.append(nxt)
-                        return cnt
-                    
-                    can_reach_v = False
-                    q_chk = deque([curr]); seen_chk = {curr}
-                    while q_chk:
-                        c_chk = q_chk.popleft()
-                        if c_chk == v: can_reach_v = True; break
-                        for nxt_chk in temp_adj.get(c_chk, []):
-                            if nxt_chk not in seen_chk: seen_chk.add(nxt_chk); q_chk.append(nxt_chk)
-                    
-                    temp_adj[curr].append(v); temp_adj[v].append(curr)
-                    if can_reach_v: chosen_v = v; break
-                if chosen_v is None: chosen_v = neighbors[0]
+        while left:
+            # Chọn cạnh chưa dùng đầu tiên (thứ tự tự nhiên) KHÔNG phải cầu; toàn cầu -> lấy cạnh đầu.
+            # Bổ đề chẵn lẻ: tại curr có tối đa 1 cạnh cầu -> thường chỉ phải kiểm tra 1-2 ứng viên
+            end = off[cu + 1]; i = ptr[cu]
+            while i < end and used[i]: i += 1
+            ptr[cu] = i
+            if i == end: break 
+            chosen = i
+            while i < end:
+                if not used[i]:
+                    if not is_bridge(cu, i): chosen = i; break
+                i += 1
+            v = tgt[chosen]
+            if trace: yield Step('traverse', 'Cross {u}-{v}', curr, ids[v])
             
-            if chosen_v is None: break 
-            steps.append({'type': 'traverse', 'u': curr, 'v': chosen_v, 'desc': f'Cross {curr}-{chosen_v}'})
-            
-            temp_adj[curr].remove(chosen_v)
-            if chosen_v in temp_adj and curr in temp_adj[chosen_v]: temp_adj[chosen_v].remove(curr)
-            curr = chosen_v; path.append(curr)
-        
-        steps.append({'type': 'path', 'nodes': path, 'desc': 'Fleury Done'})
-        return steps
+            used[chosen] = used[twin[chosen]] = 1; left -= 1
+            curr = ids[v]; cu = v; path.append(curr)
+
+        # Kẹt ở curr mà còn cạnh chưa đi -> các cạnh nằm ở nhiều thành phần (cùng kiểm tra như Hierholzer)
+        if left:
+            return (yield from self._fail('LỖI: Các cạnh không liên thông, không có đường/chu trình Euler.', trace))
+        if trace: yield Step('path', 'Fleury Done', None, None, None, path)
+        return {'path': path}
+
+    @staticmethod
+    def _twin_arcs(g):
+        """CSR Vô Hướng: mỗi cạnh u-v có 2 cung i (u->v) và twin[i] (v->u). Khuyên u-u chỉ có 1 cung (twin = chính nó)"""
+        off, tgt = g.offsets, g.targets
+        twin = array('l', [0]) * len(tgt)
+        for u in range(len(g)):
+            for i in range(off[u], off[u + 1]):
+                v = tgt[i]; twin[i] = bisect_left(tgt, u, off[v], off[v + 1])
+        return twin
+
+    @staticmethod
+    def _bridges(g, twin):
+        """Tarjan (khử đệ quy) trên CSR vô hướng: bytearray đánh dấu các cung thuộc cầu (cả 2 chiều)"""
+        off, tgt = g.offsets, g.targets
+        n = len(g); bridge = bytearray(len(tgt))
+        disc = array('l', [-1]) * n; low = array('l', [0]) * n; clock = 0
+        for r in range(n):
+            if disc[r] >= 0: continue
+            disc[r] = low[r] = clock; clock += 1
+            stack = [(r, -1, off[r])]   # (đỉnh, cung cha, cung kế tiếp cần xét)
+            while stack:
+                u, pa, i = stack[-1]
+                if i < off[u + 1]:
+                    stack[-1] = (u, pa, i + 1)
+                    v = tgt[i]
+                    if i == pa or v == u: continue   # bỏ cung về cha (twin của cung cây) và khuyên
+                    if disc[v] < 0:
+                        disc[v] = low[v] = clock; clock += 1
+                        stack.append((v, twin[i], off[v]))
+                    elif disc[v] < low[u]: low[u] = disc[v]
+                else:
+                    stack.pop()
+                    if stack:
+                        p = stack[-1][0]
+                        if low[u] < low[p]: low[p] = low[u]
+                        if low[u] > disc[p]: bridge[pa] = bridge[twin[pa]] = 1
+        return bridge
 
      # NÂNG CAO 7.5: Thuật toán HIERHOLZER 
-    def hierholzer(self, start_node=None):
-        steps = []
-        # [BLOCK] Hierholzer (Block directed cho an toàn)
-        if self.is_directed:
-             steps.append({'type': 'info', 'desc': 'LỖI: Thuật toán này hiện chỉ hỗ trợ Đồ thị Vô Hướng.'})
-             return steps
-             
-        if not self.nodes: return steps
-        
-        # Logic Vô Hướng
-        odd = [u for u in self.adj if len(self.adj[u]) % 2 != 0]
-        if odd: 
-            steps.append({'type': 'info', 'desc': f'LỖI: Không có chu trình Euler (Có {len(odd)} đỉnh bậc lẻ)'})
-            return steps
-            
-        temp_adj = {u: list(v.keys()) for u, v in self.adj.items()}
-        start_node = list(self.nodes.keys())[0]
-        for n in self.nodes:
-             if temp_adj.get(n): start_node = n; break
-             
-        stack = [start_node]; circuit = []
-        steps.append({'type': 'highlight', 'nodes': [start_node], 'desc': f'Hierholzer Start: {start_node}'})
+    def hierholzer(self, start_node=None, trace=True):
+        steps, res = self._drain(self.iter_hierholzer(start_node, trace))
+        return steps if trace else res
+
+    def iter_hierholzer(self, start_node=None, trace=True):
+        # Có Hướng: cần bán bậc ra = vào (chu trình) hoặc lệch đúng 1 ở 2 đỉnh (đường đi)
+        # Vô Hướng: 0 đỉnh bậc lẻ (chu trình) hoặc 2 (đường đi, bắt đầu ở 1 đỉnh lẻ)
+        if not self.nodes: return {'path': []}
+        g = self.get_csr(); ids, off, tgt = g.ids, g.offsets, g.targets
+        n = len(g); m = len(tgt); directed = g.is_directed
+        start = g.index[start_node] if start_node in g.index else None
+
+        # Điều kiện bậc đọc từ thống kê sống: O(1), không quét đồ thị
+        if directed:
+            skew = self._view.unbalanced
+            plus = [u for u in skew if len(self.adj[u]) - len(self.radj[u]) == 1]
+            minus = [u for u in skew if len(self.radj[u]) - len(self.adj[u]) == 1]
+            if skew and not (len(skew) == 2 and len(plus) == 1 and len(minus) == 1):
+                return (yield from self._fail('LỖI: Không có đường/chu trình Euler (Có {x} đỉnh lệch bán bậc vào/ra)', trace, x=len(skew)))
+            begin = g.index[plus[0]] if plus else None
+        else:
+            twin = self._twin_arcs(g); used = bytearray(m)
+            odd = self._view.odd
+            if len(odd) > 2:
+                return (yield from self._fail('LỖI: Không có đường/chu trình Euler (Có {x} đỉnh bậc lẻ)', trace, x=len(odd)))
+            begin = g.index[start_node if start_node in odd else min(odd, key=_natural_key)] if odd else None
+        edges = self._view.edge_count
+
+        circuit_mode = begin is None
+        if circuit_mode:   # chu trình: ưu tiên đỉnh user chọn nếu có cạnh, không thì đỉnh có cạnh đầu tiên
+            begin = start if start is not None and off[start + 1] > off[start] else None
+            if begin is None:
+                begin = g.index[next(iter(self.nodes))]
+                for nid in self.nodes:
+                    if off[g.index[nid] + 1] > off[g.index[nid]]: begin = g.index[nid]; break
+
+        # Mỗi cung dùng đúng 1 lần: ptr[u] = cung kế tiếp chưa xét của u (thứ tự tự nhiên của CSR)
+        ptr = array('l', off[:n])
+        stack = [begin]; circuit = []
+        if trace: yield Step('highlight', 'Hierholzer Start: {u}', ids[begin])
         while stack:
-            u = stack[-1]
-            if temp_adj.get(u):
-                neighbors = sorted(temp_adj[u], key=lambda x: int(x) if x.isdigit() else x)
-                v = neighbors[0]
+            u = stack[-1]; i = ptr[u]; end = off[u + 1]
+            if not directed:
+                while i < end and used[i]: i += 1
+            if i < end:
+                ptr[u] = i + 1; v = tgt[i]
+                if not directed: used[i] = used[twin[i]] = 1
                 stack.append(v)
-                temp_adj[u].remove(v)
-                if v in temp_adj and u in temp_adj[v]: temp_adj[v].remove(u)
-                steps.append({'type': 'traverse', 'u': u, 'v': v, 'desc': f'Go {u}->{v}'})
+                if trace: yield Step('traverse', 'Go {u}->{v}', ids[u], ids[v])
             else:
-                node = stack.pop(); circuit.append(node)
-                steps.append({'type': 'current', 'node': node, 'desc': f'Backtrack {node}'})
-        steps.append({'type': 'path', 'nodes': circuit[::-1], 'desc': 'Euler Circuit Found'})
-        return steps
+                ptr[u] = i; stack.pop(); circuit.append(ids[u])
+                if trace: yield Step('current', 'Backtrack {u}', ids[u])
+        if len(circuit) - 1 != edges:
+            return (yield from self._fail('LỖI: Các cạnh không liên thông, không có đường/chu trình Euler.', trace))
+        path = circuit[::-1]
+        if trace: yield Step('path', 'Euler Circuit Found' if circuit_mode else 'Euler Path Found', None, None, None, path)
+        return {'path': path, 'circuit': circuit_mode}
 
-    
\ No newline at end of file
@@ -4,6 +4,12 @@ import tkinter as tk
 from tkinter import simpledialog, messagebox, filedialog, ttk
 import math
 import json
+import itertools
+import queue
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
 
 # --- FIX UTF-8 WINDOWS ---
 try:
@@ -14,7 +20,7 @@ except AttributeError: pass
 
 # --- IMPORT LOGIC ---
 try:
-    from graph_logic import GraphLogic
+    from graph_logic import GraphLogic, Step, StepTrace
 except ImportError:
     messagebox.showerror("Lỗi", "Thiếu file 'graph_logic.py'")
     sys.exit()
@@ -28,6 +34,126 @@ COLOR_EDGE = "#ffffff"
 COLOR_HIGHLIGHT = "#ffeb3b"
 COLOR_PATH = "#f44336"
 COLOR_MAP_BIPARTITE = {0: "#f44336", 1: "#2196f3"}
+MATRIX_BLOCK = 30        # Tab Dữ liệu: in tối đa 30x30 ô ma trận mỗi trang (đồ thị lớn -> tóm tắt + phân trang)
+DATA_VIEW_LINES = 2000   # Tab Dữ liệu: số dòng tối đa của danh sách kề / danh sách cạnh
+# Khung nhìn: zoom/pan + mức chi tiết (LOD) theo zoom
+ZOOM_MIN, ZOOM_MAX = 0.02, 5.0
+LOD_LABELS = 0.6          # zoom < ngưỡng: bỏ số trọng số + tên đỉnh
+LOD_AGGREGATE = 0.25      # zoom < ngưỡng: gộp đỉnh/cạnh theo ô AGG_CELL px trên màn hình
+MAX_VISIBLE_NODES = 2000  # Khung nhìn chứa nhiều đỉnh hơn -> cũng vẽ kiểu gộp (số item luôn bị chặn)
+AGG_CELL = 16             # Cạnh 1 ô gộp (px)
+MAX_AGG_EDGES = 3000      # Số đường gộp tối đa mỗi frame (giữ các đường gộp nhiều cạnh nhất)
+MAX_VISIBLE_EDGES = 10000 # Tổng bậc các đỉnh trong khung (>= số cạnh cần vẽ) vượt ngưỡng, vd. có đỉnh hub -> cũng vẽ kiểu gộp
+# Trình phát animation: tốc độ = số step / giây, thanh trượt 0..100 ứng với 10^(v/25) = 1..10000 step/s
+FRAME_MS = 40             # Nhịp vẽ tối thiểu khi phát nhanh (~25 frame/s); nhiều step gộp vào 1 frame
+SPEED_DEFAULT = 6         # ~1.7 step/s (như nhịp 600 ms cũ)
+LOG_PER_FRAME = 50        # Mỗi frame chỉ ghi log tối đa chừng này step (phần còn lại ghi gọn 1 dòng)
+MAX_FRAME_EDGES = 256     # Số cạnh "vừa đi" tối đa được tô đậm trong 1 frame
+POLL_MS = 50             # Chu kỳ main thread hỏi worker (nhận step mới + cập nhật tiến độ)
+LOOKAHEAD = 200_000      # Chỉ nhận step khi trace đã về chưa vượt vị trí phát quá chừng này -> worker bị chặn lại
+
+class AlgoWorker:
+    """Chạy generator thuật toán trên thread nền để cửa sổ không bị đơ.
+    Step được gom lô đẩy qua queue (lô đầu gửi ngay -> animate bắt đầu sớm), main thread lấy ra
+    bằng root.after. Queue có giới hạn: main chưa lấy thì worker đứng đợi, không chạy vượt xa (bộ nhớ bị chặn).
+    Hủy hợp tác: cờ cancelled được kiểm tra giữa 2 step và trong lúc đợi chỗ trống, rồi đóng generator.
+    Tin kết thúc ('done', giá trị return của generator) / ('cancelled', None) / ('error', e) luôn được gửi"""
+    BATCH = 256        # Tối đa số step / lô
+    FLUSH_SEC = 0.02   # ... hoặc gửi lô sau mỗi khoảng này
+    MAX_BATCHES = 8    # Sức chứa queue (số lô)
+    PUT_SEC = 0.05     # Queue đầy: cứ chừng này lại xem cờ hủy 1 lần
+
+    def __init__(self, steps, cancelled=None):
+        self.queue = queue.Queue(maxsize=self.MAX_BATCHES); self.cancelled = cancelled or threading.Event()
+        self.counts = Counter()   # Tiến độ: số step theo loại (worker ghi, main chỉ đọc để hiển thị)
+        self.thread = threading.Thread(target=self._run, args=(iter(steps),), daemon=True)
+        self.thread.start()
+
+    def running(self): return self.thread.is_alive()
+
+    def _put(self, item):
+        """Đợi chỗ trống trong queue; False nếu bị hủy trong lúc đợi"""
+        while True:
+            try: self.queue.put(item, timeout=self.PUT_SEC); return True
+            except queue.Full:
+                if self.cancelled.is_set(): return False
+
+    def _run(self, it):
+        batch = []; counts = self.counts; last = 0.0; end = ('cancelled', None)
+        try:
+            while not self.cancelled.is_set():
+                try: step = next(it)
+                except StopIteration as stop: end = ('done', stop.value); break
+                batch.append(step); counts[step.type] += 1
+                now = time.perf_counter()
+                if len(batch) >= self.BATCH or now - last >= self.FLUSH_SEC:
+                    if not self._put(('steps', batch)): break
+                    batch = []; last = now
+        except Exception as e: end = ('error', e)
+        finally:
+            if batch: self._put(('steps', batch))
+            if hasattr(it, 'close'): it.close()
+            self.queue.put(end)   # Đã hủy thì main lấy hết queue không giới hạn -> không kẹt ở đây
+
+class TracePlayer:
+    """Trạng thái hiển thị sau pos step đầu của 1 StepTrace: đỉnh đã thăm, màu, cạnh vừa đi, đường đi.
+    Tiến = áp thêm step lên trạng thái (bao nhiêu step cũng chỉ vẽ 1 lần). Lần đầu áp, mỗi step ghi lại mốc
+    thay đổi: step thăm đầu tiên của từng đỉnh, các lần đổi màu, step 'path' + step xóa đường đó.
+    Lùi / tua = dựng lại trạng thái ở vị trí bất kỳ từ các mốc trong O(V), không chép trạng thái định kỳ"""
+
+    def __init__(self, trace):
+        self.trace = trace; self.scanned = 0   # scanned: các step [0, scanned) đã ghi mốc
+        self.first = {}                        # đỉnh -> step đầu tiên thăm nó
+        self.color_at = {}                     # đỉnh -> [(step, màu)] theo thứ tự step
+        self.path_at = []; self.path_end = []  # step 'path' + step đầu tiên xóa đường đó (None = chưa bị xóa)
+        self.pos = 0; self.visited = set(); self.colors = {}; self.path = None; self.edges = []
+
+    def advance(self, n):
+        """Áp tối đa n step kế tiếp (trong phần trace đã có).
+        Trả về (số step đã áp, tối đa LOG_PER_FRAME step cuối) -> không giữ list mọi step để log"""
+        start = self.pos; end = min(start + n, len(self.trace))
+        tail = deque(maxlen=LOG_PER_FRAME); edges = deque(maxlen=MAX_FRAME_EDGES)
+        visited = self.visited; scanned = self.scanned
+        for i in range(start, end):
+            step = self.trace[i]; tail.append(step); typ = step.type; new = i >= scanned; nid = None
+            if typ in ('highlight', 'current'): nid = step.nodes[0] if step.nodes else step.u
+            elif typ == 'traverse': edges.append((step.u, step.v)); nid = step.v
+            elif typ == 'color':
+                color = COLOR_MAP_BIPARTITE[step.x]; self.colors[step.u] = color
+                if new: self.color_at.setdefault(step.u, []).append((i, color))
+            elif typ == 'path':
+                self.path = step.nodes
+                if new: self.path_at.append(i); self.path_end.append(None)
+            if nid or typ == 'traverse':
+                if nid not in visited:
+                    visited.add(nid)
+                    if new: self.first.setdefault(nid, i)
+                if self.path is not None:
+                    self.path = None
+                    if new: self.path_end[-1] = i
+        self.pos = end; self.scanned = max(scanned, end); self.edges = list(edges)
+        return end - start, tail
+
+    def seek(self, i):
+        """Tới đúng vị trí i (0..len): tiến gần thì áp tiếp; lùi, hoặc tiến xa trong phần đã ghi mốc
+        (áp 1 step đắt cỡ vài chục lần xét 1 mốc) thì dựng lại từ các mốc rồi mới áp phần chưa ghi"""
+        i = max(0, min(i, len(self.trace))); j = min(i, self.scanned)
+        if j < self.pos or (j - self.pos) * 32 > len(self.first) + len(self.color_at): self._rebuild(j)
+        self.advance(i - self.pos)
+        last = self.trace[i - 1] if i else None   # Như khi đi từng bước: chỉ tô cạnh của step cuối
+        self.edges = [(last.u, last.v)] if last is not None and last.type == 'traverse' else []
+
+    def _rebuild(self, i):
+        """Trạng thái ở vị trí i (<= scanned) dựng thẳng từ các mốc: O(V + số lần đổi màu)"""
+        self.pos = i
+        self.visited = {nid for nid, k in self.first.items() if k < i}
+        self.colors = {}
+        for nid, changes in self.color_at.items():
+            k = bisect_left(changes, (i,))   # đổi màu cuối cùng trước step i
+            if k: self.colors[nid] = changes[k - 1][1]
+        k = bisect_left(self.path_at, i) - 1   # step 'path' cuối cùng trước i, còn hiệu lực nếu chưa bị xóa
+        live = k >= 0 and (self.path_end[k] is None or self.path_end[k] >= i)
+        self.path = self.trace[self.path_at[k]].nodes if live else None
 
 class GraphApp:
     def __init__(self, root):
@@ -41,6 +167,14 @@ class GraphApp:
         self.selected_node = None
         self.edge_start = None
         self.drag_data = {"x": 0, "y": 0, "item": None}
+        self.worker = None   # AlgoWorker đang chạy (hoặc vừa chạy xong) của animation
+        self.job = None      # AlgoWorker của việc nặng không animate (all-pairs, centrality)
+        self.player = None; self.is_animating = False; self.anim_tick = None   # TracePlayer của lần chạy gần nhất
+        self.thick_edges = set()   # Khóa các cạnh đang vẽ đậm
+        self.zoom = 1.0; self.pan_x = self.pan_y = 0.0   # màn hình = thế giới * zoom + pan
+        self.draw_args = {}        # Tham số highlight của lần draw_graph gần nhất (giữ lại khi zoom/pan)
+        self.scene_key = None; self.scene_lod = None; self.agg_items = []; self.agg_cache = None
+        self.edge_refs = Counter()   # Khóa cạnh đang vẽ -> số đầu mút của nó đang trong khung nhìn
 
         self._init_ui()
 
@@ -54,18 +188,31 @@ class GraphApp:
         self._btn(left_panel, "Nhập Dữ Liệu (Text)", self.show_manual_input, "#9c27b0")
         self._btn(left_panel, "Lưu Graph (JSON)", self.save_graph)
         self._btn(left_panel, "Mở Graph (Load)", self.load_graph, "#009688")
+        self._btn(left_panel, "Lưu Trace (JSONL)", self.save_trace)
         self._btn(left_panel, "Đổi: Vô Hướng/Có Hướng", self.toggle_directed, "blue")
+        self._btn(left_panel, "Khung nhìn: Vừa đồ thị", self.fit_view)
+        self._btn(left_panel, "Hủy Thuật Toán", self.cancel_algo, "#795548")
+        self.lbl_progress = tk.Label(left_panel, text="", bg=COLOR_PANEL, fg="#aaa", font=("Arial", 8))
+        self.lbl_progress.pack()
         
         tk.Label(left_panel, text="THUẬT TOÁN CƠ BẢN", bg=COLOR_PANEL, fg="cyan", font=("Arial", 10, "bold")).pack(pady=(20, 5))
         self._btn(left_panel, "BFS (Rộng)", lambda: self.run_algo('bfs'))
         self._btn(left_panel, "DFS (Sâu)", lambda: self.run_algo('dfs'))
         self._btn(left_panel, "Dijkstra (Ngắn nhất)", lambda: self.run_algo('dijkstra'))
+        self._btn(left_panel, "A* (Heuristic tọa độ)", lambda: self.run_algo('astar'))
+        self._btn(left_panel, "Dijkstra 2 chiều", lambda: self.run_algo('bidijkstra'))
         self._btn(left_panel, "Check 2 Phía", lambda: self.run_algo('bipartite'))
+        self._btn(left_panel, "Sắp xếp Topo", lambda: self.run_algo('topo'))
+        self._btn(left_panel, "Tìm Chu Trình", lambda: self.run_algo('cycle'))
 
         tk.Label(left_panel, text="THUẬT TOÁN NÂNG CAO", bg=COLOR_PANEL, fg="orange", font=("Arial", 10, "bold")).pack(pady=(20, 5))
         self._btn(left_panel, "Prim (MST)", lambda: self.run_algo('prim'))
         self._btn(left_panel, "Kruskal (MST)", lambda: self.run_algo('kruskal'))
+        self._btn(left_panel, "All-Pairs (Khoảng cách)", self.run_all_pairs)
+        self._btn(left_panel, "Tâm / Đường kính / Closeness", self.run_centrality)
         self._btn(left_panel, "Ford-Fulkerson", lambda: self.run_algo('ford'))
+        self._btn(left_panel, "Luồng cực đại (Dinic)", lambda: self.run_algo('dinic'))
+        self._btn(left_panel, "Luồng cực đại (Push-Relabel)", lambda: self.run_algo('pushrelabel'))
         
         tk.Label(left_panel, text="--- EULER ---", bg=COLOR_PANEL, fg="#aaa", font=("Arial", 8)).pack(pady=(5, 2))
         self._btn(left_panel, "Fleury", lambda: self.run_algo('fleury'))
@@ -91,7 +238,14 @@ class GraphApp:
         self.tab_data = tk.Frame(self.tabs, bg=COLOR_PANEL)
         self.tabs.add(self.tab_data, text="Dữ liệu")
         
-        tk.Label(self.tab_data, text="1. MA TRẬN KỀ", bg=COLOR_PANEL, fg="white", font=("Arial", 8, "bold")).pack(anchor="w")
+        matrix_bar = tk.Frame(self.tab_data, bg=COLOR_PANEL)
+        matrix_bar.pack(fill="x")
+        tk.Label(matrix_bar, text="1. MA TRẬN KỀ", bg=COLOR_PANEL, fg="white", font=("Arial", 8, "bold")).pack(side=tk.LEFT)
+        tk.Button(matrix_bar, text="▶", command=lambda: self.matrix_step(1), bg="#555", fg="white", relief="flat").pack(side=tk.RIGHT)
+        tk.Button(matrix_bar, text="◀", command=lambda: self.matrix_step(-1), bg="#555", fg="white", relief="flat").pack(side=tk.RIGHT)
+        self.lbl_matrix_page = tk.Label(matrix_bar, text="", bg=COLOR_PANEL, fg="#aaa", font=("Arial", 8))
+        self.lbl_matrix_page.pack(side=tk.RIGHT)
+        self.matrix_page = 0
         self.txt_matrix = tk.Text(self.tab_data, bg="#222", fg="white", font=("Consolas", 9), height=8)
         self.txt_matrix.pack(fill="x", padx=2)
         
@@ -103,6 +257,26 @@ class GraphApp:
         self.txt_edges = tk.Text(self.tab_data, bg="#222", fg="white", font=("Consolas", 9), height=8)
         self.txt_edges.pack(fill="both", expand=True, padx=2)
 
+        tk.Label(self.tab_data, text="4. KHOẢNG CÁCH (ALL-PAIRS, cùng khối với ma trận)", bg=COLOR_PANEL, fg="white", font=("Arial", 8, "bold")).pack(anchor="w", pady=(5,0))
+        self.txt_dist = tk.Text(self.tab_data, bg="#222", fg="white", font=("Consolas", 9), height=8)
+        self.txt_dist.pack(fill="x", padx=2)
+
+        # PLAYER (dưới canvas): về đầu / lùi / phát-dừng / tiến / tới cuối + tua + tốc độ
+        bar = tk.Frame(self.root, bg=COLOR_PANEL)
+        bar.pack(side=tk.BOTTOM, fill=tk.X)
+        for text, cmd in (("⏮", lambda: self.seek_to(0)), ("◀", self.step_back), ("⏯", self.toggle_play),
+                          ("▶", self.step_forward), ("⏭", self.jump_to_end)):
+            tk.Button(bar, text=text, command=cmd, bg="#555", fg="white", relief="flat", width=3).pack(side=tk.LEFT, padx=1)
+        self.lbl_player = tk.Label(bar, text="", bg=COLOR_PANEL, fg="#aaa", font=("Arial", 8), width=14)
+        self.lbl_player.pack(side=tk.RIGHT)
+        self.speed = 1.0
+        self.speed_scale = tk.Scale(bar, from_=0, to=100, orient=tk.HORIZONTAL, showvalue=False, length=120, label="Tốc độ",
+                                    command=self.on_speed, bg=COLOR_PANEL, fg="white", highlightthickness=0, font=("Arial", 7))
+        self.speed_scale.pack(side=tk.RIGHT); self.speed_scale.set(SPEED_DEFAULT)
+        self.seek_scale = tk.Scale(bar, from_=0, to=0, orient=tk.HORIZONTAL, showvalue=False,
+                                   command=self.on_seek, bg=COLOR_PANEL, highlightthickness=0)
+        self.seek_scale.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
         # CANVAS
         self.canvas = tk.Canvas(self.root, bg=COLOR_BG, highlightthickness=0)
         self.canvas.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
@@ -119,10 +293,18 @@ class GraphApp:
         self.canvas.bind("<B1-Motion>", self.on_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_release)
         self.canvas.bind("<Button-3>", self.on_click_right)
+        # Zoom: lăn chuột (Linux: Button-4/5). Pan: kéo chuột giữa hoặc Shift + kéo chuột trái
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", self.on_wheel)
+        self.canvas.bind("<Button-5>", self.on_wheel)
+        self.canvas.bind("<Button-2>", self.on_pan_start)
+        self.canvas.bind("<B2-Motion>", self.on_pan)
+        self.canvas.bind("<Shift-Button-1>", self.on_pan_start)
+        self.canvas.bind("<Shift-B1-Motion>", self.on_pan)
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
 
-        # Update initial UI state
-        self.toggle_directed() # Gọi 1 lần để set label đúng
-        self.toggle_directed() # Gọi lại lần 2 để về lại mode mặc định
+        # Update initial UI state: chỉ set label theo mode hiện tại, không đổi mode 2 lần
+        self.lbl_mode.config(text="CHẾ ĐỘ: CÓ HƯỚNG" if self.algo.is_directed else "CHẾ ĐỘ: VÔ HƯỚNG")
 
     def _btn(self, parent, text, cmd, color="#555"):
         tk.Button(parent, text=text, command=cmd, bg=color, fg="white", relief="flat", width=25, font=("Arial", 9)).pack(pady=2)
@@ -140,6 +322,7 @@ class GraphApp:
             except Exception as e: messagebox.showerror("Lỗi", str(e))
             
     def load_graph(self):
+        if self._busy(): return
         # 1. Mở hộp thoại chọn file
         f = filedialog.askopenfilename(filetypes=[("JSON Files", "*.json")])
         if not f: return # Người dùng bấm Cancel thì thôi
@@ -177,10 +360,8 @@ class GraphApp:
             # 5. Tái tạo các Edge (Cạnh)
             # data["adj"] có dạng: { "1": {"2": 10}, "2": {"3": 5} }
             adj_data = data.get("adj", {})
-            for u, neighbors in adj_data.items():
-                for v, w in neighbors.items():
-                    # Lưu ý: add_edge trong logic của ông có thể tự lọc trùng nếu là vô hướng
-                    self.algo.add_edge(str(u), str(v), int(w))
+            # Nạp 1 lượt qua add_edges (upsert O(1)/cạnh, tự lọc trùng)
+            self.algo.add_edges((str(u), str(v), int(w)) for u, neighbors in adj_data.items() for v, w in neighbors.items())
 
             # 6. Vẽ lại & Báo cáo
             self.draw_graph()
@@ -190,6 +371,18 @@ class GraphApp:
         except Exception as e:
             messagebox.showerror("Lỗi Load File", f"File hỏng hoặc sai định dạng!\n{str(e)}")
 
+    def save_trace(self):
+        trace = getattr(self, 'anim_trace', None)
+        if trace is None: messagebox.showwarning("!", "Chưa chạy thuật toán nào."); return
+        f = filedialog.asksaveasfilename(defaultextension=".jsonl", filetypes=[("JSON Lines", "*.jsonl")])
+        if f: self._when_done(lambda: self._export_trace(trace, f))   # Đợi worker chạy nốt phần trace chưa về
+
+    def _export_trace(self, trace, f):
+        try:
+            trace.export(f)
+            self.log(f"Đã lưu trace ({len(trace)} bước): {f}")
+        except Exception as e: messagebox.showerror("Lỗi", str(e))
+
     def show_manual_input(self):
         win = tk.Toplevel(self.root)
         win.title("Nhập Dữ Liệu")
@@ -206,6 +399,7 @@ class GraphApp:
         tk.Button(win, text="VẼ", command=on_confirm, bg="#4caf50", fg="white").pack(fill="x", padx=10, pady=10)
 
     def process_manual_data(self, data_str):
+        if self._busy(): return
         self.clear_all()
         lines = data_str.split('\n')
         nodes_set = set(); edges = []
@@ -229,36 +423,108 @@ class GraphApp:
                     y = cy + int(radius * math.sin(angle))
                     self.algo.add_node(nid, x, y)
                     if nid.isdigit(): self.node_counter = max(self.node_counter, int(nid) + 1)
-            for u, v, w in edges: self.algo.add_edge(u, v, w)
+            self.algo.add_edges(edges)
             self.draw_graph(); self.update_data_view()
         except Exception as e: messagebox.showerror("Lỗi", str(e))
 
     def update_data_view(self):
-        nodes, mat = self.algo.get_matrix()
-        self.txt_matrix.delete(1.0, tk.END)
-        if nodes:
-            header = "   " + " ".join([f"{n:>3}" for n in nodes]) + "\n"
-            self.txt_matrix.insert(tk.END, header)
-            for i, row in enumerate(mat):
-                self.txt_matrix.insert(tk.END, f"{nodes[i]:>3} " + " ".join([f"{x:>3}" for x in row]) + "\n")
+        self.render_matrix()
 
+        # Danh sách kề / cạnh: chỉ in DATA_VIEW_LINES dòng đầu, ghép 1 chuỗi rồi insert 1 lần
         self.txt_adj.delete(1.0, tk.END)
-        for u in self.algo.adj:
-            line = f"{u}: " + ", ".join([f"{v}({w})" for v, w in self.algo.adj[u].items()]) + "\n"
-            self.txt_adj.insert(tk.END, line)
+        lines = [f"{u}: " + ", ".join([f"{v}({w})" for v, w in self.algo.adj[u].items()])
+                 for u in itertools.islice(self.algo.adj, DATA_VIEW_LINES)]
+        self.txt_adj.insert(tk.END, self._capped(lines, len(self.algo.adj)))
 
         self.txt_edges.delete(1.0, tk.END)
-        edges = self.algo.get_edge_list()
-        for u, v, w in edges:
-            arrow = "->" if self.algo.is_directed else "--"
-            self.txt_edges.insert(tk.END, f"{u} {arrow} {v} (w={w})\n")
+        arrow = "->" if self.algo.is_directed else "--"
+        lines = [f"{u} {arrow} {v} (w={w})" for u, v, w in itertools.islice(self.algo.iter_edges(), DATA_VIEW_LINES)]
+        self.txt_edges.insert(tk.END, self._capped(lines, self.algo.stats()['edges']))
+
+    @staticmethod
+    def _capped(lines, total):
+        text = "\n".join(lines) + "\n" if lines else ""
+        if total > len(lines): text += f"... (còn {total - len(lines)} dòng)\n"
+        return text
+
+    def render_matrix(self):
+        """Ma trận kề theo khối MATRIX_BLOCK x MATRIX_BLOCK: đồ thị nhỏ in đủ, lớn thì tóm tắt + phân trang"""
+        self.txt_matrix.delete(1.0, tk.END)
+        sparse = self.algo.get_sparse_matrix()
+        n, nnz = sparse['shape'][0], sparse['nnz']
+        if not n: self.lbl_matrix_page.config(text=""); return
+        blocks = -(-n // MATRIX_BLOCK); pages = blocks * blocks
+        self.matrix_page = max(0, min(self.matrix_page, pages - 1))
+        br, bc = divmod(self.matrix_page, blocks)
+        rows, cols, block = self.algo.get_matrix_block(br * MATRIX_BLOCK, (br + 1) * MATRIX_BLOCK,
+                                                      bc * MATRIX_BLOCK, (bc + 1) * MATRIX_BLOCK)
+        lines = []
+        if pages > 1:
+            lines.append(f"{n} đỉnh, {nnz} ô khác 0 (mật độ {nnz / (n * n):.2%}). "
+                         f"Hàng {rows[0]}..{rows[-1]} x Cột {cols[0]}..{cols[-1]}")
+        lines.append("   " + " ".join([f"{c:>3}" for c in cols]))
+        lines += [f"{r:>3} " + " ".join([f"{x:>3}" for x in row]) for r, row in zip(rows, block)]
+        self.txt_matrix.insert(tk.END, "\n".join(lines) + "\n")
+        self.lbl_matrix_page.config(text=f"Khối {self.matrix_page + 1}/{pages}" if pages > 1 else "")
+
+        # Khoảng cách all-pairs (nếu đã tính cho đồ thị hiện tại): cùng khối hàng/cột
+        self.txt_dist.delete(1.0, tk.END)
+        ap = self.algo.all_pairs(cached_only=True)
+        if ap is None:
+            self.txt_dist.insert(tk.END, "(Chưa tính - bấm 'All-Pairs (Khoảng cách)')\n"); return
+        dist = ap.block(br * MATRIX_BLOCK, (br + 1) * MATRIX_BLOCK, bc * MATRIX_BLOCK, (bc + 1) * MATRIX_BLOCK)
+        lines = [f"[{ap.method}]   " + " ".join([f"{c:>3}" for c in cols])]
+        lines += [f"{r:>3} " + " ".join([f"{'∞' if x is None else x:>3}" for x in row]) for r, row in zip(rows, dist)]
+        self.txt_dist.insert(tk.END, "\n".join(lines) + "\n")
+
+    def run_all_pairs(self):
+        """Tính khoảng cách mọi cặp đỉnh (tự chọn Floyd–Warshall / Johnson / Dijkstra / BFS) trên worker rồi hiện ở tab Dữ liệu"""
+        if not self.algo.nodes: self.log("Đồ thị trống."); return
+        def job(cancel):   # Đếm cặp tới được (duyệt n x n) cũng làm trên worker, không làm trên Tk thread
+            res = self.algo.all_pairs(cancel=cancel)
+            return res, (None if isinstance(res, dict) else res.reachable_count())
+        def done(out):
+            res, pairs = out
+            if pairs is None: self.log(res['error']); return
+            self.log(f"All-Pairs ({res.method}): {len(res.nodes)} đỉnh - {pairs} cặp tới được")
+            self.update_data_view(); self.tabs.select(self.tab_data)
+        self.run_job("All-Pairs", job, done)
+
+    def run_centrality(self):
+        """Eccentricity, đường kính, tâm + top closeness: BFS/Dijkstra từ mọi đỉnh (song song nếu đồ thị lớn), trên worker"""
+        if not self.algo.nodes: self.log("Đồ thị trống."); return
+        def job(cancel):   # 1 lượt SSSP (source_summaries cache theo version) cho cả 2
+            rows = self.algo.source_summaries(cancel=cancel)
+            if isinstance(rows, dict): return rows, None   # cạnh âm / đã hủy
+            return self.algo.diameter(), self.algo.closeness()
+        def done(out):
+            res, closeness = out
+            if 'error' in res: self.log(res['error'])   # Không liên thông: vẫn có closeness (chuẩn hóa Wasserman–Faust)
+            else:
+                self.log(f"Đường kính: {res['diameter']} | Bán kính: {res['radius']}")
+                self.log(f"Tâm: {', '.join(res['center'][:20])}" + (" ..." if len(res['center']) > 20 else ""))
+            if closeness is None: return
+            top = sorted(closeness.items(), key=lambda kv: -kv[1])[:5]
+            self.log("Closeness cao nhất: " + ", ".join(f"{u}={c:.3f}" for u, c in top))
+        self.run_job("Centrality", job, done)
+
+    def matrix_step(self, delta):
+        self.matrix_page += delta; self.render_matrix()
 
     def log(self, msg):
         self.lbl_status.config(text=str(msg))
         self.log_text.insert(tk.END, ">> " + str(msg) + "\n")
         self.log_text.see(tk.END)
 
+    def log_many(self, msgs):
+        """Ghi nhiều dòng log bằng 1 lần insert"""
+        if not msgs: return
+        self.lbl_status.config(text=str(msgs[-1]))
+        self.log_text.insert(tk.END, "".join(">> " + str(m) + "\n" for m in msgs))
+        self.log_text.see(tk.END)
+
     def toggle_directed(self):
+        if self._busy(): return
         # [FIX] Logic chuẩn: Rebuild graph
         new_mode = not self.algo.is_directed
         self.algo.set_mode(new_mode)
@@ -270,24 +536,27 @@ class GraphApp:
 
     # --- EVENTS ---
     def on_click_left(self, event):
+        if self._busy(): return
         clicked = self.get_node_at(event.x, event.y)
         if clicked:
             self.drag_data["item"] = clicked; self.drag_data["x"] = event.x; self.drag_data["y"] = event.y
         else:
             nid = str(self.node_counter)
-            self.algo.add_node(nid, event.x, event.y)
+            self.algo.add_node(nid, *self._to_world(event.x, event.y))
             self.node_counter += 1
             self.draw_graph(); self.update_data_view()
 
     def on_drag(self, event):
         nid = self.drag_data["item"]
         if nid:
-            self.algo.nodes[nid] = (event.x, event.y)
-            self.draw_graph()
+            cell = self.algo.grid.where.get(nid)
+            self.algo.move_node(nid, *self._to_world(event.x, event.y))
+            self.move_node_items(nid, cell)
 
     def on_release(self, event): self.drag_data["item"] = None
 
     def on_click_right(self, event):
+        if self._busy(): return
         target = self.get_node_at(event.x, event.y)
         if target:
             if self.edge_start and self.edge_start != target:
@@ -308,16 +577,17 @@ class GraphApp:
         self.log(f"Chọn nối từ {node}...")
 
     def delete_node(self, node):
+        if self._busy(): return
         self.algo.remove_node(node)
         if self.edge_start == node: self.edge_start = None
         self.draw_graph(); self.update_data_view()
 
     def get_node_at(self, x, y):
-        for nid, (nx, ny) in self.algo.nodes.items():
-            if math.hypot(nx-x, ny-y) <= NODE_R: return nid
-        return None
+        # (x, y) là tọa độ màn hình; tra lưới chỉ mục theo tọa độ thế giới, không quét hết các đỉnh
+        return self.algo.node_at(*self._to_world(x, y), NODE_R)
 
     def clear_all(self):
+        if self._busy(): return
         # [FIX] Truyền đúng tham số để không bị lỗi mất canvas
         self.algo = GraphLogic(canvas=self.canvas, is_directed=self.algo.is_directed)
         self.node_counter = 1
@@ -325,55 +595,283 @@ class GraphApp:
         self.draw_graph(); self.update_data_view()
         self.log("Đã Reset.")
 
+    # --- VIEW: zoom / pan (tọa độ thế giới = algo.nodes) ---
+    def _to_screen(self, x, y): return x * self.zoom + self.pan_x, y * self.zoom + self.pan_y
+
+    def _to_world(self, sx, sy): return (sx - self.pan_x) / self.zoom, (sy - self.pan_y) / self.zoom
+
+    def _viewport(self):
+        """Hình chữ nhật (thế giới) đang hiện trên canvas, nới thêm 1 bán kính đỉnh"""
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if w <= 1: w, h = 1200, 800   # Cửa sổ chưa map
+        (x0, y0), (x1, y1) = self._to_world(0, 0), self._to_world(w, h)
+        return x0 - NODE_R, y0 - NODE_R, x1 + NODE_R, y1 + NODE_R
+
+    def redraw(self):
+        """Vẽ lại theo khung nhìn mới, giữ nguyên highlight đang hiện"""
+        self.draw_graph(**self.draw_args)
+
+    def on_wheel(self, event):
+        up = getattr(event, 'delta', 0) > 0 or getattr(event, 'num', None) == 4
+        self.zoom_at(event.x, event.y, 1.2 if up else 1 / 1.2)
+
+    def zoom_at(self, sx, sy, factor):
+        """Zoom quanh điểm màn hình (sx, sy): điểm thế giới dưới con trỏ đứng yên"""
+        wx, wy = self._to_world(sx, sy)
+        self.zoom = max(ZOOM_MIN, min(ZOOM_MAX, self.zoom * factor))
+        self.pan_x, self.pan_y = sx - wx * self.zoom, sy - wy * self.zoom
+        self.redraw()
+
+    def on_pan_start(self, event): self.pan_from = (event.x, event.y)
+
+    def on_pan(self, event):
+        px, py = self.pan_from; self.pan_from = (event.x, event.y)
+        self.pan_x += event.x - px; self.pan_y += event.y - py
+        self.redraw()
+
+    def fit_view(self):
+        """Zoom/pan để cả đồ thị vừa khung canvas"""
+        if not self.algo.nodes: self.zoom = 1.0; self.pan_x = self.pan_y = 0.0; self.redraw(); return
+        xs = [p[0] for p in self.algo.nodes.values()]; ys = [p[1] for p in self.algo.nodes.values()]
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if w <= 1: w, h = 1200, 800
+        pad = 2 * NODE_R
+        zoom = min((w - 2 * pad) / max(max(xs) - min(xs), 1), (h - 2 * pad) / max(max(ys) - min(ys), 1))
+        self.zoom = max(ZOOM_MIN, min(ZOOM_MAX, zoom))
+        self.pan_x = w / 2 - (min(xs) + max(xs)) / 2 * self.zoom
+        self.pan_y = h / 2 - (min(ys) + max(ys)) / 2 * self.zoom
+        self.redraw()
+
     # --- DRAW & ANIM ---
-    def draw_edge(self, x1, y1, x2, y2, directed=True, color=COLOR_EDGE, width=2):
+    # Canvas giữ item cố định cho từng đỉnh/cạnh TRONG KHUNG NHÌN (không xóa-vẽ lại mỗi frame):
+    #   node_items[nid] = [oval, tên]; edge_items[key] = [line, nền số, số, trọng số, độ dày]
+    # Đổi cấu trúc / khung nhìn -> chỉ tạo/xóa phần chênh lệch; kéo đỉnh -> coords các item liên thuộc;
+    # highlight -> itemconfig đúng những item đổi kiểu. Zoom nhỏ: bỏ nhãn (LOD_LABELS), rồi gộp theo ô (LOD_AGGREGATE).
+    @staticmethod
+    def _edge_line(x1, y1, x2, y2, r=NODE_R):
+        """Tọa độ đoạn cạnh cắt bớt r ở 2 đầu (mũi tên không chui vào đỉnh)"""
         dx = x2 - x1; dy = y2 - y1
         dist = math.hypot(dx, dy)
         if dist == 0: dist = 1
-        ox = dx / dist * NODE_R; oy = dy / dist * NODE_R
-        
-        # --- SỬA DÒNG DƯỚI ĐÂY ---
+        ox = dx / dist * r; oy = dy / dist * r
+        return x1+ox, y1+oy, x2-ox, y2-oy
+
+    def draw_edge(self, x1, y1, x2, y2, directed=True, color=COLOR_EDGE, width=2):
         arrow_val = tk.LAST if directed else tk.NONE
-        
-        self.canvas.create_line(
-            x1+ox, y1+oy, x2-ox, y2-oy, 
+        return self.canvas.create_line(
+            *self._edge_line(x1, y1, x2, y2, NODE_R * self.zoom),
             fill=color, width=width, 
             arrow=arrow_val, # type: ignore
-            arrowshape=(12,15,5)
+            arrowshape=(12,15,5), tags="edge"
         )
 
+    def _edge_key(self, u, v):
+        return (u, v) if self.algo.is_directed else tuple(sorted((u, v)))
+
+    def _create_edge(self, key, w, labels):
+        (x1, y1), (x2, y2) = self._to_screen(*self.algo.nodes[key[0]]), self._to_screen(*self.algo.nodes[key[1]])
+        item = [self.draw_edge(x1, y1, x2, y2, self.algo.is_directed, COLOR_EDGE, 2), None, None, w, 2]
+        if labels:
+            mx, my = (x1+x2)/2, (y1+y2)/2
+            bg = 8   # Nền đen che dây đi cho số nó nổi
+            item[1] = self.canvas.create_rectangle(mx-bg, my-bg, mx+bg, my+bg, fill=COLOR_BG, outline="", tags="edge")
+            item[2] = self.canvas.create_text(mx, my, text=str(w), fill="#38c6e6", font=("Arial", 12, "bold"), tags="edge")
+        return item
+
+    def _create_node(self, nid, labels):
+        x, y = self._to_screen(*self.algo.nodes[nid]); r = NODE_R * self.zoom
+        self.node_style[nid] = (COLOR_NODE, "white")
+        return [self.canvas.create_oval(x-r, y-r, x+r, y+r, fill=COLOR_NODE, outline="white", width=2, tags="node"),
+                self.canvas.create_text(x, y, text=nid, fill="white", font=("Arial", 10, "bold"), tags="node") if labels else None]
+
+    def _place_node(self, nid):
+        x, y = self._to_screen(*self.algo.nodes[nid]); r = NODE_R * self.zoom
+        oval, text = self.node_items[nid]
+        self.canvas.coords(oval, x-r, y-r, x+r, y+r)
+        if text is not None: self.canvas.coords(text, x, y)
+
+    def _place_edge(self, key):
+        (x1, y1), (x2, y2) = self._to_screen(*self.algo.nodes[key[0]]), self._to_screen(*self.algo.nodes[key[1]])
+        line, rect, label = self.edge_items[key][:3]
+        self.canvas.coords(line, *self._edge_line(x1, y1, x2, y2, NODE_R * self.zoom))
+        if rect is not None:
+            mx, my = (x1+x2)/2, (y1+y2)/2; bg = 8
+            self.canvas.coords(rect, mx-bg, my-bg, mx+bg, my+bg); self.canvas.coords(label, mx, my)
+
+    def _incident_edges(self, u):
+        """{khóa cạnh: trọng số} của các cạnh chạm u (Có Hướng: cả cạnh ra lẫn cạnh vào)"""
+        algo = self.algo; adj = algo.adj
+        edges = {self._edge_key(u, v): w for v, w in adj[u].items()}
+        if algo.is_directed:
+            for x in algo.radj[u]: edges.setdefault((x, u), adj[x][u])
+        return edges
+
+    def _sync_scene(self):
+        """Đồng bộ item canvas với đồ thị + khung nhìn; không làm gì nếu cả 2 chưa đổi"""
+        algo = self.algo; vp = self._viewport()
+        key = (algo, algo.version, algo.is_directed, self.zoom, self.pan_x, self.pan_y, vp)
+        if key == self.scene_key: return
+        old = self.scene_key; self.scene_key = key
+        visible = None
+        if self.zoom < LOD_AGGREGATE or algo.grid.count_rect(*vp) > MAX_VISIBLE_NODES: lod = 'agg'
+        else:
+            # Cạnh cần vẽ = cạnh có ít nhất 1 đầu trong khung nhìn, tổng bậc là cận trên của số cạnh đó
+            visible = set(algo.nodes_in_rect(*vp))
+            if sum(map(algo.degree, visible)) > MAX_VISIBLE_EDGES: lod = 'agg'
+            else: lod = 'plain' if self.zoom < LOD_LABELS else 'full'
+        reset = old is None or old[0] is not algo or old[2] != algo.is_directed or lod != self.scene_lod or lod == 'agg'
+        if reset:
+            # Đồ thị mới (Reset/Load), đổi chế độ (khóa cạnh + mũi tên đổi), đổi mức chi tiết -> dựng lại từ đầu
+            self.canvas.delete("all")
+            self.node_items = {}; self.edge_items = {}; self.node_style = {}; self.agg_items = []
+            self.edge_refs = Counter()
+        elif old[3] != self.zoom:
+            for nid in self.node_items: self._place_node(nid)
+            for k in self.edge_items: self._place_edge(k)
+        elif (old[4], old[5]) != (self.pan_x, self.pan_y):
+            self.canvas.move("all", self.pan_x - old[4], self.pan_y - old[5])   # Chỉ pan: dời nguyên khối
+        self.scene_lod = lod
+        if lod == 'agg': self._draw_aggregate(*vp); return
+
+        labels = lod == 'full'
+        leaving = [n for n in self.node_items if n not in visible]
+        entering = [n for n in visible if n not in self.node_items]
+        for nid in leaving:
+            self.canvas.delete(*[i for i in self.node_items.pop(nid) if i is not None]); del self.node_style[nid]
+        for nid in entering: self.node_items[nid] = self._create_node(nid, labels)
+
+        refs = self.edge_refs; created = False
+        if not reset and old[1] == algo.version:
+            # Cùng cấu trúc (pan / zoom / kéo đỉnh): tập cạnh chỉ đổi theo các đỉnh ra / vào khung
+            for nid in leaving:
+                for k in self._incident_edges(nid):
+                    refs[k] -= 1
+                    if not refs[k]:
+                        del refs[k]; self.canvas.delete(*[i for i in self.edge_items.pop(k)[:3] if i is not None])
+            for nid in entering:
+                for k, w in self._incident_edges(nid).items():
+                    refs[k] += 1
+                    if k not in self.edge_items: self.edge_items[k] = self._create_edge(k, w, labels); created = True
+        else:
+            # Cấu trúc đổi: dựng lại tập cạnh từ các đỉnh trong khung (đã bị chặn bởi MAX_VISIBLE_EDGES)
+            edges = {}; refs.clear()
+            for u in visible:
+                for k, w in self._incident_edges(u).items(): edges.setdefault(k, w); refs[k] += 1
+            for k in [k for k in self.edge_items if k not in edges]:
+                self.canvas.delete(*[i for i in self.edge_items.pop(k)[:3] if i is not None])
+            for k, w in edges.items():
+                item = self.edge_items.get(k)
+                if item is None: self.edge_items[k] = self._create_edge(k, w, labels); created = True
+                elif item[3] != w:
+                    if item[2] is not None: self.canvas.itemconfig(item[2], text=str(w))
+                    item[3] = w
+        if created: self.canvas.tag_raise("node")   # Đỉnh luôn nằm trên cạnh
+
+    def _agg_level(self, level):
+        """(số đỉnh theo ô gộp, số cạnh giữa các cặp ô gộp) ở mức level: 1 ô gộp = 2^level x 2^level ô
+        của SpatialGrid. Tính 1 lần mỗi version + mức, dùng lại khi pan / zoom qua lại"""
+        algo = self.algo
+        if self.agg_cache is None or self.agg_cache[0] != (algo, algo.version): self.agg_cache = ((algo, algo.version), {})
+        levels = self.agg_cache[1]
+        if level not in levels:
+            grid = algo.grid; where = grid.where; dots = Counter(); links = {}
+            for (c, r), bucket in grid.cells.items(): dots[c >> level, r >> level] += len(bucket)
+            for u, row in algo.adj.items():
+                cu = where[u]; bu = (cu[0] >> level, cu[1] >> level)
+                for v in row:
+                    if not algo.is_directed and v < u: continue
+                    cv = where[v]; bv = (cv[0] >> level, cv[1] >> level)
+                    if bu != bv:
+                        links.setdefault(bu, Counter())[bv] += 1; links.setdefault(bv, Counter())[bu] += 1
+            levels[level] = (dots, links)
+        return levels[level]
+
+    def _draw_aggregate(self, x0, y0, x1, y1):
+        """Zoom quá nhỏ / quá nhiều đỉnh: mỗi ô gộp (>= AGG_CELL px) vẽ 1 chấm cỡ theo số đỉnh, mỗi cặp ô
+        có cạnh vẽ 1 đường dày theo số cạnh. Chỉ duyệt các ô gộp trong khung nhìn -> số ô / frame bị chặn"""
+        grid = self.algo.grid
+        level = max(0, math.ceil(math.log2(AGG_CELL / (self.zoom * grid.cell))))
+        s = grid.cell << level; dots, links = self._agg_level(level)
+        def center(b): return self._to_screen((b[0] + 0.5) * s, (b[1] + 0.5) * s)
+        c0, r0, c1, r1 = int(x0 // s), int(y0 // s), int(x1 // s), int(y1 // s)
+        visible = {(c, r) for c in range(c0, c1 + 1) for r in range(r0, r1 + 1) if (c, r) in dots}
+        lines = Counter()
+        for b in visible:
+            for o, n in links.get(b, {}).items():
+                if o not in visible or b < o: lines[b, o] += n   # cặp nằm trọn trong khung chỉ đếm 1 lần
+
+        create = self.canvas.create_line; items = self.agg_items
+        for (ba, bb), n in lines.most_common(MAX_AGG_EDGES):
+            items.append(create(*center(ba), *center(bb), fill="#888", width=min(1 + n.bit_length() // 2, 5)))
+        for b in visible:
+            (x, y), r = center(b), min(2 + dots[b].bit_length(), AGG_CELL // 2)
+            items.append(self.canvas.create_oval(x-r, y-r, x+r, y+r, fill=COLOR_NODE, outline=""))
+
+    def _agg_link(self, links, a, b, d):
+        for x, y in ((a, b), (b, a)):
+            row = links.setdefault(x, Counter()); row[y] += d
+            if not row[y]: del row[y]
+
+    def _agg_move(self, nid, old, new):
+        """Đỉnh nid đổi ô lưới old -> new: sửa tại chỗ số đỉnh / số cạnh của các ô gộp bị ảnh hưởng
+        ở mọi mức đã cache, O(bậc) mỗi mức thay vì đếm lại cả đồ thị"""
+        algo = self.algo
+        if self.agg_cache is None or self.agg_cache[0] != (algo, algo.version): return
+        where = algo.grid.where
+        nbrs = [v for v in algo.adj[nid] if v != nid]   # cùng cách đếm với _agg_level (bỏ khuyên)
+        if algo.is_directed: nbrs += [u for u in algo.radj[nid] if u != nid]
+        for level, (dots, links) in self.agg_cache[1].items():
+            bo, bn = (old[0] >> level, old[1] >> level), (new[0] >> level, new[1] >> level)
+            if bo == bn: continue
+            dots[bo] -= 1; dots[bn] += 1
+            if not dots[bo]: del dots[bo]
+            for v in nbrs:
+                cv = where[v]; bv = (cv[0] >> level, cv[1] >> level)
+                if bv != bo: self._agg_link(links, bo, bv, -1)
+                if bv != bn: self._agg_link(links, bn, bv, 1)
+
+    def move_node_items(self, nid, old_cell=None):
+        """Kéo đỉnh: chỉ dời oval/nhãn của nó và các cạnh liên thuộc. old_cell: ô lưới trước khi dời"""
+        cell = self.algo.grid.where.get(nid)
+        if old_cell is not None and cell != old_cell: self._agg_move(nid, old_cell, cell)
+        if self.scene_lod == 'agg':   # Vẽ kiểu gộp: chỉ vẽ lại (phần trong khung) khi đỉnh sang ô khác
+            if cell != old_cell: self.scene_key = None; self.redraw()
+            return
+        if nid not in self.node_items:   # Đỉnh ngoài khung -> đồng bộ lại
+            self.scene_key = None; self.redraw(); return
+        self._place_node(nid)
+        algo = self.algo
+        keys = [self._edge_key(nid, v) for v in algo.adj.get(nid, ())]
+        if algo.is_directed: keys += [(u, nid) for u in algo.radj.get(nid, ())]
+        for k in keys:
+            if k in self.edge_items: self._place_edge(k)
+
     def draw_graph(self, highlight_nodes=None, highlight_edges=None, path_nodes=None, colors=None):
-        self.canvas.delete("all")
-        h_nodes = highlight_nodes or []; h_edges = highlight_edges or []; p_nodes = path_nodes or []; cols = colors or {}
+        self.draw_args = dict(highlight_nodes=highlight_nodes, highlight_edges=highlight_edges, path_nodes=path_nodes, colors=colors)
+        self._sync_scene()
+        h_nodes = set(highlight_nodes or ()); p_nodes = set(path_nodes or ()); cols = colors or {}
         
         # Update mode label
         txt = "CHẾ ĐỘ: CÓ HƯỚNG" if self.algo.is_directed else "CHẾ ĐỘ: VÔ HƯỚNG"
         self.lbl_mode.config(text=txt)
 
-        processed = set()
-        for u in self.algo.adj:
-            for v, w in self.algo.adj[u].items():
-                key = (u,v) if self.algo.is_directed else tuple(sorted((u,v)))
-                if key in processed: continue
-                processed.add(key)
-                if u in self.algo.nodes and v in self.algo.nodes:
-                    x1, y1 = self.algo.nodes[u]; x2, y2 = self.algo.nodes[v]
-                    width = 4 if (u,v) in h_edges or (v,u) in h_edges else 2
-                    self.draw_edge(x1, y1, x2, y2, self.algo.is_directed, COLOR_EDGE, width)
-                    mx, my = (x1+x2)/2, (y1+y2)/2
-                    # Vẽ cái nền đen che dây đi cho số nó nổi
-                    bg = 8
-                    self.canvas.create_rectangle(mx-bg, my-bg, mx+bg, my+bg, fill=COLOR_BG, outline="")
-                    # Vẽ số lên trên
-                    self.canvas.create_text(mx, my, text=str(w), fill="#38c6e6", font=("Arial", 12, "bold"))
-
-        for nid, (x, y) in self.algo.nodes.items():
+        # Cạnh: chỉ itemconfig cạnh đổi độ dày (cạnh đậm cũ + cạnh đậm mới)
+        thick = {self._edge_key(u, v) for u, v in (highlight_edges or ())}
+        for key in thick | self.thick_edges:
+            item = self.edge_items.get(key)
+            if item is None: continue
+            width = 4 if key in thick else 2
+            if item[4] != width: self.canvas.itemconfig(item[0], width=width); item[4] = width
+        self.thick_edges = thick
+
+        # Đỉnh: so kiểu mới với kiểu đang hiển thị, chỉ itemconfig đỉnh khác
+        for nid, style in self.node_style.items():
             fill = cols.get(nid, COLOR_NODE)
             if nid in p_nodes: fill = COLOR_PATH
             elif nid in h_nodes: fill = COLOR_HIGHLIGHT
-            outline = COLOR_HIGHLIGHT if nid == self.edge_start else "white"
-            self.canvas.create_oval(x-NODE_R, y-NODE_R, x+NODE_R, y+NODE_R, fill=fill, outline=outline, width=2)
-            self.canvas.create_text(x, y, text=nid, fill="white", font=("Arial", 10, "bold"))
+            new = (fill, COLOR_HIGHLIGHT if nid == self.edge_start else "white")
+            if new != style:
+                self.canvas.itemconfig(self.node_items[nid][0], fill=new[0], outline=new[1]); self.node_style[nid] = new
 
     # --- HELPER: Hộp thoại nhập Node an toàn ---
     def ask_node(self, title, prompt):
@@ -391,6 +889,7 @@ class GraphApp:
                 messagebox.showerror("Lỗi", f"Node '{val}' không tồn tại! Nhập lại đi.")
 
     def run_algo(self, name):
+        if self._busy(): return
         if not self.algo.nodes: 
             messagebox.showwarning("!", "Graph trống trơn, vẽ gì đi bro!"); return
         
@@ -403,7 +902,7 @@ class GraphApp:
         end_node = None
 
         # 1. NHÓM CẦN START & END
-        if name in ['dijkstra', 'ford']:
+        if name in ['dijkstra', 'astar', 'bidijkstra', 'ford', 'dinic', 'pushrelabel']:
             start_node = self.ask_node("Input", f"Chọn Node BẮT ĐẦU cho {name}:")
             if not start_node: return 
             end_node = self.ask_node("Input", f"Chọn Node KẾT THÚC cho {name}:")
@@ -414,16 +913,19 @@ class GraphApp:
             start_node = self.ask_node("Input", f"Chọn Node BẮT ĐẦU cho {name}:")
             if not start_node: return
 
-        # 3. NHÓM TỰ ĐỘNG (Kruskal, Bipartite) -> Không cần hỏi gì cả
+        # 3. NHÓM TỰ ĐỘNG (Kruskal, Bipartite, Topo, Chu trình) -> Không cần hỏi gì cả
 
         # --- CHẠY THUẬT TOÁN ---
         self.log(f">> Running {name} | Start={start_node} | End={end_node}")
         
+        # Lấy generator (iter_*): step được sinh dần khi animate cần, frame đầu hiện ngay
         steps = []; final_colors = None
         try:
-            if name == 'bfs': steps = self.algo.bfs(start_node)
-            elif name == 'dfs': steps = self.algo.dfs(start_node)
-            elif name == 'dijkstra': steps = self.algo.dijkstra(start_node, end_node)
+            if name == 'bfs': steps = self.algo.iter_bfs(start_node)
+            elif name == 'dfs': steps = self.algo.iter_dfs(start_node)
+            elif name == 'dijkstra': steps = self.algo.iter_dijkstra(start_node, end_node)
+            elif name == 'astar': steps = self.algo.iter_dijkstra(start_node, end_node, method='astar')
+            elif name == 'bidijkstra': steps = self.algo.iter_dijkstra(start_node, end_node, method='bidirectional')
             elif name == 'prim': 
                 # Prim cần trick một chút để đảm bảo nó bắt đầu từ đúng node user chọn
                 # Logic cũ của Prim tự lấy node[0], giờ ta sửa lại logic gọi hàm hoặc
@@ -433,21 +935,23 @@ class GraphApp:
                 # Nếu không sửa bên kia thì nó sẽ mặc định lấy node đầu tiên.
                 # Để triệt để, bạn nên sửa def prim(self, start_node=None) bên logic nhé.
                 # Tạm thời gọi thế này nếu logic chưa sửa:
-                steps = self.algo.prim(start_node)
+                steps = self.algo.iter_prim(start_node)
                 # (Lưu ý: Bạn nên vào prim bên logic sửa dòng 'start = ...' thành 'start = start_node if start_node else ...')
 
-            elif name == 'kruskal': steps = self.algo.kruskal()
-            elif name == 'ford': steps = self.algo.ford_fulkerson(start_node, end_node)
+            elif name == 'kruskal': steps = self.algo.iter_kruskal()
+            elif name == 'ford': steps = self.algo.iter_ford_fulkerson(start_node, end_node)
+            elif name == 'dinic': steps = self.algo.iter_ford_fulkerson(start_node, end_node, method='dinic')
+            elif name == 'pushrelabel': steps = self.algo.iter_ford_fulkerson(start_node, end_node, method='push_relabel')
             
-            elif name == 'bipartite':
-                res, steps, final_colors = self.algo.check_bipartite()
-                steps.append({'type': 'info', 'desc': "KẾT QUẢ: 2 Phía OK" if res else "KẾT QUẢ: KHÔNG PHẢI 2 PHÍA"})
+            elif name == 'bipartite': steps = self._bipartite_steps()
+            elif name == 'topo': steps = self.algo.iter_topological_sort()
+            elif name == 'cycle': steps = self.algo.iter_find_cycle()
             
             elif name == 'fleury': 
                 # Fleury cũng nên nhận start node nếu muốn chuẩn chỉ
-                steps = self.algo.fleury(start_node) 
+                steps = self.algo.iter_fleury(start_node) 
             elif name == 'hierholzer': 
-                steps = self.algo.hierholzer(start_node)
+                steps = self.algo.iter_hierholzer(start_node)
 
         except Exception as e: 
             self.log(f"Crash: {e}")
@@ -456,34 +960,176 @@ class GraphApp:
             
         self.animate(steps, final_colors)
 
+    def _bipartite_steps(self):
+        # Màu cuối chỉ biết khi generator chạy xong -> gán final_colors rồi báo kết quả
+        res = yield from self.algo.iter_check_bipartite()
+        if 'error' in res: return
+        self.final_colors = {nid: COLOR_MAP_BIPARTITE[c] for nid, c in res['coloring'].items()}
+        yield Step('info', "KẾT QUẢ: 2 Phía OK" if res['bipartite'] else "KẾT QUẢ: KHÔNG PHẢI 2 PHÍA")
+
+    # --- WORKER: chạy nền, tiến độ, hủy ---
+    def _running(self):
+        return [w for w in (self.worker, self.job) if w is not None and w.running()]
+
+    def _busy(self):
+        """Đang có thuật toán chạy nền -> chặn sửa đồ thị / chạy thêm (worker đang đọc dữ liệu)"""
+        if not self._running(): return False
+        self.log("Thuật toán đang chạy - đợi xong hoặc bấm 'Hủy Thuật Toán'.")
+        return True
+
+    def cancel_algo(self):
+        running = self._running()
+        for w in running: w.cancelled.set()
+        if running: self.log("Đang hủy...")
+        elif self.is_animating: self.log("Đã dừng animation (⏯ để phát tiếp).")
+        self.is_animating = False
+
+    def run_job(self, name, fn, on_done):
+        """Việc nặng không animate: fn(cancel) chạy trên AlgoWorker (cửa sổ không đơ), xong thì on_done(kết quả)
+        trên main thread. cancel = cờ hủy của worker, fn phải tự xem nó (GraphLogic nhận qua tham số cancel)"""
+        if self._busy(): return
+        cancel = threading.Event()
+        def steps():
+            yield Step('info', f"{name}: đang tính...")   # Mốc để cờ hủy được xem trước khi bắt đầu
+            return fn(cancel)
+        self.log(f">> {name}: đang tính trên nền...")
+        self.job = AlgoWorker(steps(), cancel); self._poll_job(self.job, name, on_done)
+
+    def _poll_job(self, job, name, on_done):
+        while True:
+            try: kind, data = job.queue.get_nowait()
+            except queue.Empty: self.root.after(POLL_MS, self._poll_job, job, name, on_done); return
+            if kind == 'steps': continue
+            if kind == 'error':
+                self.log(f"Crash: {data}")
+                import traceback; traceback.print_exception(data) # In lỗi ra console để debug
+            elif kind == 'cancelled' or job.cancelled.is_set(): self.log(f"Đã hủy {name}.")
+            else: on_done(data)
+            return
+
+    def _drain_worker(self, limit=True):
+        """Nhận lô step đã về vào anim_trace; gặp tin kết thúc -> đánh dấu anim_done.
+        limit: trace đã về vượt vị trí phát quá LOOKAHEAD thì thôi nhận, worker đứng đợi ở queue đầy
+        (đã hủy thì nhận hết để worker gửi được tin kết thúc)"""
+        worker = self.worker
+        while not self.anim_done:
+            if limit and not worker.cancelled.is_set() and len(self.anim_trace) - self.player.pos >= LOOKAHEAD: break
+            try: kind, data = worker.queue.get_nowait()
+            except queue.Empty: break
+            if kind == 'steps': self.anim_trace.extend(data); self.seek_scale.config(to=len(self.anim_trace)); continue
+            self.anim_done = True
+            if kind == 'error':
+                self.log(f"Crash: {data}"); self.is_animating = False
+                import traceback; traceback.print_exception(data) # In lỗi ra console để debug
+            elif kind == 'cancelled': self.log(f"Đã hủy sau {len(self.anim_trace)} bước.")
+        c = worker.counts
+        self.lbl_progress.config(text=f"{sum(c.values())} bước | xét {c['current']} đỉnh | {c['path']} đường"
+                                      + ("" if self.anim_done else " ..."))
+
+    def _poll_worker(self):
+        self._drain_worker()
+        if not self.anim_done: self.root.after(POLL_MS, self._poll_worker)
+
+    # --- PLAYER: phát trace theo tốc độ, gộp nhiều step / frame, tua / lùi / tới cuối ---
     def animate(self, steps, final_colors=None):
-        self.step_idx = 0; self.anim_steps = steps; self.final_colors = final_colors
-        self.is_animating = True; self.anim_visited = set()
-        self._next_step()
+        # steps: list hoặc generator -> chạy trên AlgoWorker (thread nền), step về tới đâu phát tới đó.
+        # Step đã về được ghi gọn vào anim_trace (StepTrace) -> TracePlayer tua tới / lui tùy ý.
+        self.final_colors = final_colors
+        self.anim_trace = StepTrace(); self.anim_done = False
+        self.player = TracePlayer(self.anim_trace)
+        self.worker = AlgoWorker(steps)
+        self.play(); self._poll_worker()
+
+    def _at_end(self): return self.anim_done and self.player.pos == len(self.anim_trace)
+
+    def play(self):
+        self.is_animating = True
+        if self.anim_tick is None: self._tick()
+
+    def pause(self): self.is_animating = False
+
+    def toggle_play(self):
+        if self.player is None: return
+        if self.is_animating: self.pause(); return
+        if self._at_end(): self.player.seek(0)   # Hết rồi -> phát lại từ đầu
+        self.play()
+
+    def on_speed(self, value): self.speed = 10 ** (float(value) / 25)
 
-    def _next_step(self):
+    def _tick(self):
+        """1 frame: áp số step ứng với tốc độ, vẽ 1 lần trạng thái cuối, hẹn frame kế"""
+        self.anim_tick = None
         if not self.is_animating: return
-        if self.step_idx >= len(self.anim_steps):
-            if self.final_colors: self.draw_graph(colors=self.final_colors)
-            self.log("DONE."); self.is_animating = False; return
-        
-        step = self.anim_steps[self.step_idx]; self.step_idx += 1
-        if step.get('desc'): self.log(step['desc'])
-        
-        typ = step['type']
-        h_edges = []; cols = {}
-        if typ in ['highlight', 'current']:
-            n = step.get('node') or (step.get('nodes')[0] if step.get('nodes') else None)
-            if n: self.anim_visited.add(n)
-        elif typ in ['traverse']:
-            h_edges.append((step['u'], step['v'])); self.anim_visited.add(step['v'])
-        elif typ == 'color': cols[step['node']] = COLOR_MAP_BIPARTITE[step['color']]
-        elif typ == 'path':
-            self.draw_graph(path_nodes=step['nodes']); self.log(f"Path: {'->'.join(step['nodes'])}")
-            self.is_animating = False; return
-
-        self.draw_graph(highlight_nodes=list(self.anim_visited), highlight_edges=h_edges, colors=cols)
-        self.root.after(600, self._next_step)
+        interval = max(FRAME_MS, 1000 / self.speed)   # Chậm: 1 step / frame; nhanh: frame đều FRAME_MS
+        count, steps = self.player.advance(max(1, round(self.speed * interval / 1000)))
+        if count: self._log_steps(count, steps); self._render_player()
+        if self._at_end():
+            self.is_animating = False; self._render_player(); self.log("DONE."); return
+        self.anim_tick = self.root.after(int(interval) if count else POLL_MS, self._tick)
+
+    def _log_steps(self, count, steps):
+        """count step vừa áp, steps = phần đuôi của chúng (tối đa LOG_PER_FRAME)"""
+        msgs = []
+        if count > len(steps): msgs.append(f"... ({count - len(steps)} bước)")
+        for step in steps:
+            msgs.append(step.desc)  # desc chỉ được format tại đây
+            if step.type == 'path': msgs.append(f"Path: {'->'.join(step.nodes)}")
+        self.log_many(msgs)
+
+    def _render_player(self):
+        """Vẽ trạng thái hiện tại của player (draw_graph chỉ itemconfig phần khác frame trước)"""
+        p = self.player
+        if self._at_end() and self.final_colors: self.draw_graph(colors=self.final_colors)
+        elif p.path: self.draw_graph(path_nodes=p.path, colors=p.colors)
+        else: self.draw_graph(highlight_nodes=p.visited, highlight_edges=p.edges, colors=p.colors)
+        total = len(self.anim_trace)
+        self.seek_scale.config(to=total); self.seek_scale.set(p.pos)
+        self.lbl_player.config(text=f"Bước {p.pos}/{total}" + ("" if self.anim_done else "+"))
+
+    def seek_to(self, i):
+        if self.player is None: return
+        self.pause(); self.player.seek(i); pos = self.player.pos
+        if pos: self.log(f"Tua tới bước {pos}/{len(self.anim_trace)}: {self.anim_trace[pos - 1].desc}")
+        self._render_player()
+
+    def on_seek(self, value):
+        # Tk gọi -command muộn (lúc vẽ lại khi rảnh) cả khi giá trị do code đặt (.set / config(to=) kẹp giá trị)
+        # -> không dùng cờ được; giá trị trùng vị trí đang đứng = do _render_player đặt, bỏ qua
+        if self.player is not None and int(float(value)) != self.player.pos: self.seek_to(int(float(value)))
+
+    def step_back(self):
+        if self.player is None: return
+        self.pause(); self.player.seek(self.player.pos - 1)
+        self.log(f"Lùi về bước {self.player.pos}/{len(self.anim_trace)}"); self._render_player()
+
+    def step_forward(self):
+        if self.player is None: return
+        self.pause(); count, steps = self.player.advance(1)
+        if count: self._log_steps(count, steps)
+        self._render_player()
+
+    def _when_done(self, fn):
+        """Gọi fn() khi worker đã gửi hết trace. Không join: hỏi lại bằng root.after -> cửa sổ và nút Hủy
+        vẫn chạy trong lúc đợi (hủy thì fn nhận phần trace đã có). Lần chạy bị thay bởi lần mới -> bỏ fn"""
+        worker = self.worker
+        def check():
+            if self.worker is not worker: return
+            self._drain_worker(limit=False)
+            if self.anim_done: fn()
+            else: self.root.after(POLL_MS, check)
+        if worker.running(): self.log("Đợi thuật toán chạy xong...")
+        check()
+
+    def jump_to_end(self):
+        """Áp thẳng trạng thái cuối (đợi worker chạy xong), không vẽ các frame ở giữa"""
+        if self.player is None: return
+        self.pause(); self._when_done(self._jump_to_end)
+
+    def _jump_to_end(self):
+        skipped = len(self.anim_trace) - self.player.pos; self.player.seek(len(self.anim_trace))
+        if skipped: self.log_many([f"Tới cuối: bỏ qua {skipped} bước", self.anim_trace[-1].desc] +
+                                  ([f"Path: {'->'.join(self.player.path)}"] if self.player.path else []))
+        self._render_player(); self.log("DONE.")
 
 if __name__ == "__main__":
     root = tk.Tk()